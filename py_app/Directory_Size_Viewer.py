@@ -8,12 +8,15 @@ Rustライブラリを使用して高速な計算を実現しています。
 """
 
 import os
+import stat
 import sys
 import time
 import threading
 import re
-from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Callable, Any
+import functools
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 
 from PyQt6.QtWidgets import (
     QApplication,
@@ -44,7 +47,6 @@ from PyQt6.QtCore import (
     pyqtSignal,
     pyqtSlot,
     QModelIndex,
-    QSize,
     QTimer,
 )
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
@@ -59,6 +61,154 @@ except ImportError:
     RUST_AVAILABLE = False
     print("警告: Rustライブラリが見つかりません。Pythonの実装を使用します。")
 
+# Windowsのドライブ種別の取得に使用（pywin32 がない環境やWindows以外では None）
+if sys.platform == "win32":
+    try:
+        import win32file
+    except ImportError:
+        win32file = None
+else:
+    win32file = None
+
+# アクセス拒否を示す特別な値（u64::MAX）。FFI呼び出しを避けるため読み込み時に1回だけ取得する
+if RUST_AVAILABLE:
+    ACCESS_DENIED_VALUE = rust_lib.get_access_denied_value()
+else:
+    ACCESS_DENIED_VALUE = 2**64 - 1
+
+# 進捗シグナルを送出する最小間隔（秒）
+PROGRESS_EMIT_INTERVAL = 0.05
+
+# 走査中にタイムアウトの確認と進捗報告を行うエントリ数の間隔（時刻の取得を毎回行わない）
+TIME_CHECK_INTERVAL = 64
+
+# ルート直下のサブディレクトリがこの数より多い場合のみ、スレッドで並列に走査する
+PARALLEL_MIN_SUBDIRS = 4
+
+# UNCパス（\\server\share、//server/share）の接頭辞（正規表現を使わず startswith で判定）
+UNC_PREFIXES = ("\\\\", "//")
+
+# ネットワークドライブ・オンラインストレージの判定パターン（呼び出しごとのコンパイルを避ける）
+# パス要素として現れるサービスのフォルダ名
+_BOX_DRIVE_NAMES = r"Box|BoxSync|Box Sync|BoxDrive|Box Drive"
+_CLOUD_STORAGE_NAMES = (
+    r"OneDrive|Dropbox|Google Drive|GoogleDrive|Google ドライブ|iCloud Drive|iCloudDrive"
+)
+_OTHER_CLOUD_NAMES = r"pCloud|MEGA|Nextcloud|ownCloud"
+# Box Drive
+BOX_DRIVE_PATTERN = re.compile(rf"[\\/](?:{_BOX_DRIVE_NAMES})[\\/]", re.IGNORECASE)
+# OneDrive・Dropbox・Google Drive・iCloud Drive（"OneDrive - 組織名" を含む）
+CLOUD_STORAGE_PATTERN = re.compile(
+    rf"[\\/](?:(?:{_CLOUD_STORAGE_NAMES})[\\/]|OneDrive - )", re.IGNORECASE
+)
+# ワーカーで使用する、上記とその他のクラウドストレージをまとめたパターン
+ONLINE_STORAGE_PATTERN = re.compile(
+    rf"[\\/](?:(?:{_BOX_DRIVE_NAMES}|{_CLOUD_STORAGE_NAMES}|{_OTHER_CLOUD_NAMES})[\\/]"
+    r"|OneDrive - )",
+    re.IGNORECASE,
+)
+
+# サイズ表示の単位（1024倍ごと）
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+
+# ツリービューのソートに使用するデータのロール
+SORT_ROLE = Qt.ItemDataRole.UserRole
+
+# 子の行をまだ追加していないアイテムに、DirectoryTree のノードのインデックスを保持するロール
+NODE_ROLE = Qt.ItemDataRole.UserRole + 1
+
+# ディレクトリの状態フラグ（DirectoryTree.flags の各ビット）
+FLAG_ACCESS_DENIED = 0x01  # ディレクトリ自体にアクセスできなかった
+FLAG_HAS_ACCESS_DENIED = 0x02  # 配下にアクセス拒否のディレクトリがある
+FLAG_TIMEOUT = 0x04  # タイムアウトにより走査を打ち切った
+FLAG_DEPTH_LIMITED = 0x08  # 深さ制限により配下を省略した
+FLAG_NETWORK_DRIVE = 0x10  # ネットワークドライブのため配下を省略した
+
+# ツリービューで表示名に付ける状態の表示（優先度の高い順）
+_FLAG_LABELS = (
+    (FLAG_ACCESS_DENIED, " (アクセス拒否)"),
+    (FLAG_TIMEOUT, " (タイムアウト)"),
+    (FLAG_DEPTH_LIMITED, " (深さ制限)"),
+    (FLAG_NETWORK_DRIVE, " (ネットワークドライブ - スキップ)"),
+)
+# フラグの値ごとの表示名の接尾辞（ノードごとに分岐せず、フラグの値で参照する）
+DISPLAY_SUFFIXES = tuple(
+    next((label for flag, label in _FLAG_LABELS if flags & flag), "")
+    for flags in range(0x20)
+)
+
+
+@functools.lru_cache(maxsize=32)
+def is_remote_drive(drive_letter):
+    """ドライブがネットワークドライブかどうかを判定
+
+    ドライブの種類は走査中に変わらないため、結果はドライブレターごとに記憶する。
+    """
+    return win32file.GetDriveType(drive_letter) == win32file.DRIVE_REMOTE
+
+
+class DirectoryTree:
+    """ディレクトリツリーを並列配列（SoA）で保持するクラス
+
+    ノードはインデックスで参照し、親ノードは常に子ノードより前に並ぶ。
+    ルートノードのインデックスは0で、親インデックスは-1。
+    """
+
+    __slots__ = ("paths", "sizes", "parents", "flags")
+
+    def __init__(self):
+        """空のツリーを作成"""
+        self.paths = []
+        self.sizes = array("Q")
+        self.parents = array("q")
+        self.flags = bytearray()
+
+    def __len__(self):
+        """ノード数"""
+        return len(self.paths)
+
+    def add(self, parent, path, size=0, flags=0):
+        """ノードを追加してインデックスを返す"""
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.parents.append(parent)
+        self.flags.append(flags)
+        return len(self.paths) - 1
+
+    def merge(self, index, subtree):
+        """index のノードを subtree のルートとみなして subtree を結合"""
+        self.sizes[index] += subtree.sizes[0]
+        self.flags[index] |= subtree.flags[0]
+
+        # subtree のインデックス1以降を末尾に追加し、親インデックスを付け替える
+        offset = len(self.paths) - 1
+        self.paths.extend(subtree.paths[1:])
+        self.sizes.extend(subtree.sizes[1:])
+        self.parents.extend(
+            index if parent == 0 else parent + offset
+            for parent in subtree.parents[1:]
+        )
+        self.flags.extend(subtree.flags[1:])
+
+    def children_lists(self):
+        """ノードごとの子ノードのインデックスの一覧を返す"""
+        children = [[] for _ in self.paths]
+        parents = self.parents
+        for index in range(1, len(self.paths)):
+            children[parents[index]].append(index)
+        return children
+
+    def accumulate(self):
+        """子から親へサイズとアクセス拒否フラグを集計"""
+        sizes = self.sizes
+        parents = self.parents
+        flags = self.flags
+        for index in range(len(self.paths) - 1, 0, -1):
+            parent = parents[index]
+            sizes[parent] += sizes[index]
+            if flags[index] & (FLAG_ACCESS_DENIED | FLAG_HAS_ACCESS_DENIED):
+                flags[parent] |= FLAG_HAS_ACCESS_DENIED
+
 
 class WorkerSignals(QObject):
     """ワーカースレッドからのシグナルを定義するクラス"""
@@ -66,6 +216,7 @@ class WorkerSignals(QObject):
     finished = pyqtSignal()
     error = pyqtSignal(str)
     result = pyqtSignal(object)
+    partial = pyqtSignal(list)
     progress = pyqtSignal(str, int)
     warning = pyqtSignal(str)
 
@@ -73,26 +224,42 @@ class WorkerSignals(QObject):
 class DirectorySizeWorker(QRunnable):
     """ディレクトリサイズ計算を行うワーカークラス"""
 
-    def __init__(self, directory: str, options: dict):
-        """ワーカーの初期化"""
+    def __init__(self, directory: str, options: dict, cache: Optional[dict] = None):
+        """ワーカーの初期化
+
+        cache を渡すと、Python実装の走査でディレクトリごとの結果
+        {パス: (更新日時, 直下のファイルサイズ合計, サブディレクトリのパス)} を
+        読み書きし、更新日時が変わっていないディレクトリの scandir を省略する。
+        既存ファイルの書き換えはディレクトリの更新日時に現れないため、結果は概算になる。
+        """
         super().__init__()
         self.directory = directory
         self.options = options
+        self.cache = cache
+        # is_network_drive の判定結果（パスごと）
+        self.network_drive_cache = {}
         self.signals = WorkerSignals()
         self.is_cancelled = False
-        self.last_progress_time = time.time()
-
-        # キャンセルフラグの作成（Rust実装の場合）
+        # タイムアウト判定と進捗の間引きには時刻の変更の影響を受けない monotonic を使用
+        self.last_progress_time = time.monotonic()
+        self.last_emit_time = 0.0
+        # 途中結果（完了したルート直下のサブディレクトリ）の送出待ち
+        # （Rust実装では複数のスレッドから通知されるためロックで保護する）
+        self.partial_lock = threading.Lock()
+        self.pending_partials = []
+        self.last_partial_time = 0.0
+
+        # キャンセルトークンの作成（Rust実装の場合、ワーカーの破棄とともに解放される）
         if RUST_AVAILABLE:
-            self.cancel_ptr = rust_lib.create_cancel_flag()
+            self.cancel_token = rust_lib.CancelToken()
         else:
-            self.cancel_ptr = None
+            self.cancel_token = None
 
     def cancel(self):
         """処理のキャンセル"""
         self.is_cancelled = True
-        if RUST_AVAILABLE and self.cancel_ptr is not None:
-            rust_lib.set_cancel_flag(self.cancel_ptr, True)
+        if self.cancel_token is not None:
+            self.cancel_token.set()
 
     @pyqtSlot()
     def run(self):
@@ -105,14 +272,11 @@ class DirectorySizeWorker(QRunnable):
                         f"警告: {self.directory} はネットワークドライブまたはオンラインストレージのため、スキップします。"
                     )
                     # ネットワークドライブ用の結果を作成
+                    dir_tree = DirectoryTree()
+                    dir_tree.add(-1, self.directory, flags=FLAG_NETWORK_DRIVE)
                     result = {
                         "total_size": 0,
-                        "dir_structure": {
-                            "path": self.directory,
-                            "size": 0,
-                            "children": [],
-                            "network_drive": True,
-                        },
+                        "dir_tree": dir_tree,
                         "elapsed_time": 0,
                     }
                     self.signals.result.emit(result)
@@ -127,36 +291,34 @@ class DirectorySizeWorker(QRunnable):
             if RUST_AVAILABLE:
                 # Rust実装を使用
                 try:
-                    # 進捗コールバック関数
-                    def progress_callback(path, size):
-                        self.last_progress_time = time.time()
-                        self.signals.progress.emit(path, size)
-
-                    # Rustライブラリを使用してディレクトリサイズを計算
-                    total_size, has_access_denied = (
-                        rust_lib.get_dir_size_with_cancel_py(
-                            self.directory, self.cancel_ptr, progress_callback
-                        )
+                    # Rustライブラリを使用してディレクトリ構造とサイズを1回の走査で取得
+                    nodes = rust_lib.build_dir_tree_with_cancel_py(
+                        self.directory,
+                        self.cancel_token,
+                        self.report_progress,
+                        self.report_partial,
                     )
+                    dir_tree = self.build_directory_tree(nodes)
+                    total_size = dir_tree.sizes[0]
 
-                    # ディレクトリ構造とサイズを取得
-                    dir_structure = self.get_directory_structure(self.directory, 0)
-
-                    # アクセス拒否フラグを設定
-                    dir_structure["has_access_denied"] = has_access_denied
-
+                except rust_lib.CancelledError:
+                    self.signals.error.emit("処理がキャンセルされました")
+                    return
                 except Exception as e:
-                    if "キャンセルされました" in str(e):
-                        self.signals.error.emit("処理がキャンセルされました")
-                    else:
-                        self.signals.error.emit(f"エラー: {e}")
+                    self.signals.error.emit(f"エラー: {e}")
                     return
             else:
                 # Python実装を使用
                 try:
-                    total_size, dir_structure = self.get_directory_size_py(
+                    total_size, dir_tree = self.get_directory_size_py(
                         self.directory
                     )
+                except (FileNotFoundError, NotADirectoryError):
+                    # 事前に isdir で確認せず、ルートの走査時のエラーで判定する
+                    self.signals.error.emit(
+                        f"有効なディレクトリではありません: {self.directory}"
+                    )
+                    return
                 except Exception as e:
                     self.signals.error.emit(f"エラー: {e}")
                     return
@@ -166,96 +328,66 @@ class DirectorySizeWorker(QRunnable):
             # 結果を返す
             result = {
                 "total_size": total_size,
-                "dir_structure": dir_structure,
+                "dir_tree": dir_tree,
                 "elapsed_time": elapsed_time,
-                "has_access_denied": dir_structure.get("has_access_denied", False),
+                "has_access_denied": bool(
+                    dir_tree.flags[0] & (FLAG_ACCESS_DENIED | FLAG_HAS_ACCESS_DENIED)
+                ),
             }
             self.signals.result.emit(result)
 
         except Exception as e:
             self.signals.error.emit(f"予期せぬエラー: {e}")
         finally:
-            # キャンセルフラグの解放（Rust実装の場合）
-            if RUST_AVAILABLE and self.cancel_ptr is not None:
-                rust_lib.release_cancel_flag(self.cancel_ptr)
-                self.cancel_ptr = None
-
             self.signals.finished.emit()
 
+    def report_progress(self, path, size):
+        """進捗の通知（シグナルは PROGRESS_EMIT_INTERVAL ごとに間引いて送出）"""
+        current_time = time.monotonic()
+        self.last_progress_time = current_time
+        if current_time - self.last_emit_time >= PROGRESS_EMIT_INTERVAL:
+            self.last_emit_time = current_time
+            self.signals.progress.emit(path, size)
+
+    def report_partial(self, path, size):
+        """完了したルート直下のサブディレクトリの通知
+
+        シグナルは PROGRESS_EMIT_INTERVAL ごとにまとめて送出する。最後に残った分は
+        直後の結果の表示に含まれるため送出しない。
+        """
+        with self.partial_lock:
+            self.pending_partials.append((path, size))
+            current_time = time.monotonic()
+            if current_time - self.last_partial_time < PROGRESS_EMIT_INTERVAL:
+                return
+            self.last_partial_time = current_time
+            pending, self.pending_partials = self.pending_partials, []
+        self.signals.partial.emit(pending)
+
     def is_network_drive(self, path):
+        """ネットワークドライブまたはオンラインストレージかどうかを判定（パスごとに結果を記憶）"""
+        result = self.network_drive_cache.get(path)
+        if result is None:
+            result = self._is_network_drive(path)
+            self.network_drive_cache[path] = result
+        return result
+
+    def _is_network_drive(self, path):
         """ネットワークドライブまたはオンラインストレージかどうかを判定"""
         # Windowsのネットワークドライブパターン (UNCパス)
-        if re.match(r"^\\\\", path):
+        if path.startswith(UNC_PREFIXES):
             return True
 
-        # マウントされたネットワークドライブ
-        if sys.platform == "win32":
-            # Windowsの場合
+        # マウントされたネットワークドライブ（Windowsで win32file がある場合）
+        if win32file is not None:
             drive_letter = os.path.splitdrive(path)[0]
             if drive_letter:
-                try:
-                    import win32file
-
-                    drive_type = win32file.GetDriveType(drive_letter)
-                    return drive_type == win32file.DRIVE_REMOTE
-                except ImportError:
-                    # win32fileがない場合は簡易チェック
-                    pass
-
-        # オンラインストレージの詳細なパターンチェック
-        # BoxDriveの検出強化
-        box_patterns = [
-            r"\\Box\\",
-            r"/Box/",
-            r"\\BoxSync\\",
-            r"/BoxSync/",
-            r"\\Box Sync\\",
-            r"/Box Sync/",
-            r"\\BoxDrive\\",
-            r"/BoxDrive/",
-            r"\\Box Drive\\",
-            r"/Box Drive/",
-        ]
-        for pattern in box_patterns:
-            if re.search(pattern, path, re.IGNORECASE):
-                return True
-
-        # その他のクラウドストレージサービス
-        cloud_storage_patterns = [
-            # OneDrive
-            r"\\OneDrive\\",
-            r"/OneDrive/",
-            r"\\OneDrive - ",
-            r"/OneDrive - ",
-            # Dropbox
-            r"\\Dropbox\\",
-            r"/Dropbox/",
-            # Google Drive
-            r"\\Google Drive\\",
-            r"/Google Drive/",
-            r"\\GoogleDrive\\",
-            r"/GoogleDrive/",
-            r"\\Google ドライブ\\",
-            r"/Google ドライブ/",
-            # iCloud
-            r"\\iCloud Drive\\",
-            r"/iCloud Drive/",
-            r"\\iCloudDrive\\",
-            r"/iCloudDrive/",
-            # その他の一般的なクラウドストレージ
-            r"\\pCloud\\",
-            r"/pCloud/",
-            r"\\MEGA\\",
-            r"/MEGA/",
-            r"\\Nextcloud\\",
-            r"/Nextcloud/",
-            r"\\ownCloud\\",
-            r"/ownCloud/",
-        ]
+                return is_remote_drive(drive_letter)
 
-        for pattern in cloud_storage_patterns:
-            if re.search(pattern, path, re.IGNORECASE):
-                return True
+        # オンラインストレージ（Box Drive・その他のクラウドストレージ）のパターンチェック
+        # 事前にコンパイルした1つのパターンで判定する
+        if ONLINE_STORAGE_PATTERN.search(path):
+            return True
 
         # 特定のパスパターンを持つが、ローカルディレクトリである可能性のあるケースを除外
         # 例: "C:\Users\username\Documents\Box" はBoxという名前のローカルフォルダかもしれない
@@ -270,251 +402,324 @@ class DirectorySizeWorker(QRunnable):
 
         return False
 
-    def get_directory_structure(self, directory, depth=0):
-        """ディレクトリ構造を再帰的に取得（深さ制限付き）"""
-        result = {
-            "path": directory,
-            "size": 0,
-            "children": [],
-            "has_access_denied": False,
-        }
+    def is_network_subdir(self, parent_path, path):
+        """親ディレクトリがネットワークドライブでないと判定済みの場合の、サブディレクトリの判定
 
-        # ネットワークドライブのチェック
-        if self.options.get("skip_network", True) and self.is_network_drive(directory):
-            result["network_drive"] = True
-            result["size"] = 0
-            return result
+        UNCパスかどうかとドライブの種類は親と同じため、パターンの検索だけを
+        親の最後のパス要素以降に限定して行う。
+        """
+        start = max(parent_path.rfind("\\"), parent_path.rfind("/"), 0)
+        return ONLINE_STORAGE_PATTERN.search(path, start) is not None
 
-        # 深さ制限のチェック
+    def build_directory_tree(self, nodes):
+        """Rustから返されたノード一覧（先行順）を DirectoryTree に変換"""
         max_depth = self.options.get("max_depth", 0)
-        if max_depth > 0 and depth >= max_depth:
-            result["depth_limited"] = True
-            return result
-
-        # タイムアウトのチェック
-        timeout = self.options.get("timeout", 10)
-        current_time = time.time()
-        if (
-            self.options.get("timeout_enabled", True)
-            and current_time - self.last_progress_time > timeout
-        ):
-            self.signals.warning.emit(
-                f"警告: {directory} の処理がタイムアウトしました。スキップします。"
-            )
-            result["timeout"] = True
-            return result
-
-        # ディレクトリサイズの計算
-        try:
-            # サブディレクトリを取得
-            with os.scandir(directory) as entries:
-                for entry in entries:
-                    # キャンセルチェック
-                    if self.is_cancelled:
-                        return result
-
-                    # タイムアウトチェック
-                    current_time = time.time()
-                    if (
-                        self.options.get("timeout_enabled", True)
-                        and current_time - self.last_progress_time > timeout
-                    ):
-                        self.signals.warning.emit(
-                            f"警告: {directory} の処理がタイムアウトしました。スキップします。"
-                        )
-                        result["timeout"] = True
-                        break
-
-                    if entry.is_dir():
-                        # ネットワークドライブのチェック
-                        if self.options.get(
-                            "skip_network", True
-                        ) and self.is_network_drive(entry.path):
-                            child = {
-                                "path": entry.path,
-                                "size": 0,
-                                "children": [],
-                                "network_drive": True,
-                            }
-                            result["children"].append(child)
-                            continue
-
-                        # 再帰的にサブディレクトリの構造を取得
-                        child = self.get_directory_structure(entry.path, depth + 1)
-                        result["children"].append(child)
-                        result["size"] += child["size"]
-
-                        # アクセス拒否フラグの伝播
-                        if child.get("has_access_denied", False) or child.get(
-                            "access_denied", False
-                        ):
-                            result["has_access_denied"] = True
-                    else:
-                        # ファイルサイズを取得
-                        try:
-                            file_size = entry.stat().st_size
-                            result["size"] += file_size
-                        except (PermissionError, OSError):
-                            # ファイルアクセスエラーは無視
-                            pass
-
-                    # 進捗コールバック
-                    self.signals.progress.emit(directory, result["size"])
-                    self.last_progress_time = time.time()
-
-        except PermissionError:
-            # アクセス拒否の場合
-            if self.options.get("skip_access_denied", True):
-                result["access_denied"] = True
-                result["size"] = 0  # アクセス拒否の場合はサイズを0とする
-            else:
-                # アクセス拒否をスキップしない場合は、親ディレクトリにフラグを設定
-                result["access_denied"] = True
-                result["has_access_denied"] = True
-                # サイズは0のままで、親ディレクトリの合計には影響しない
-
-        except Exception as e:
-            # その他のエラー
-            result["error"] = str(e)
-            result["size"] = 0
-
-        return result
-
-    def get_directory_size_py(self, directory, report_progress=True):
-        """Pythonによるディレクトリサイズ計算（再帰的）"""
-        total_size = 0
-        dir_structure = {
-            "path": directory,
-            "size": 0,
-            "children": [],
-            "has_access_denied": False,
-        }
+        skip_network = self.options.get("skip_network", True)
+
+        dir_tree = DirectoryTree()
+        # Rust側のインデックスから DirectoryTree のインデックスへの対応（省略したノードは-1）
+        mapping = []
+        depths = []
+
+        # ノード数だけ繰り返すループで参照する属性はローカル変数に束縛する
+        add_node = dir_tree.add
+        tree_paths = dir_tree.paths
+        tree_flags = dir_tree.flags
+        is_network_subdir = self.is_network_subdir
+        add_mapping = mapping.append
+        add_depth = depths.append
+        pruned = FLAG_NETWORK_DRIVE | FLAG_DEPTH_LIMITED
+
+        for parent, path, size, access_denied, has_access_denied in nodes:
+            flags = 0
+            if access_denied:
+                flags |= FLAG_ACCESS_DENIED
+            if has_access_denied:
+                flags |= FLAG_HAS_ACCESS_DENIED
+
+            if parent is None:
+                add_mapping(add_node(-1, path, size, flags))
+                add_depth(0)
+                continue
+
+            tree_parent = mapping[parent]
+            # 省略されたディレクトリの配下は構造に含めない
+            if tree_parent < 0 or tree_flags[tree_parent] & pruned:
+                add_mapping(-1)
+                add_depth(0)
+                continue
+
+            depth = depths[parent] + 1
+            if skip_network and is_network_subdir(tree_paths[tree_parent], path):
+                flags |= FLAG_NETWORK_DRIVE
+            elif max_depth > 0 and depth >= max_depth:
+                flags |= FLAG_DEPTH_LIMITED
+
+            add_mapping(add_node(tree_parent, path, size, flags))
+            add_depth(depth)
+
+        return dir_tree
+
+    def get_directory_size_py(self, directory):
+        """Pythonによるディレクトリサイズ計算（サブディレクトリごとに並列処理）"""
+        dir_tree = DirectoryTree()
+        dir_tree.add(-1, directory)
 
         # ネットワークドライブのチェック
         if self.options.get("skip_network", True) and self.is_network_drive(directory):
-            dir_structure["network_drive"] = True
-            return 0, dir_structure
+            dir_tree.flags[0] |= FLAG_NETWORK_DRIVE
+            return 0, dir_tree
+
+        # ルート直下だけを走査し、サブディレクトリの配下はスレッドプールで並列に走査する
+        # （stat の待ち時間が支配的なため、GILがあってもスレッドで並列化できる）
+        self.walk_subtree(dir_tree, descend=False)
+        # ネットワークドライブとして省略したサブディレクトリは走査しない
+        children = [
+            index
+            for index in range(1, len(dir_tree))
+            if not dir_tree.flags[index] & FLAG_NETWORK_DRIVE
+        ]
+        if children:
+            subtrees = {}
+            for index, subtree in self.walk_children(dir_tree, children):
+                subtrees[index] = subtree
+
+                # 完了したサブディレクトリを途中結果として通知
+                self.report_partial(subtree.paths[0], subtree.sizes[0])
+
+            # 各サブツリーは集計済みのため、ルートにはその合計だけを加算する
+            for index in children:
+                dir_tree.merge(index, subtrees[index])
+                dir_tree.sizes[0] += dir_tree.sizes[index]
+                if dir_tree.flags[index] & (FLAG_ACCESS_DENIED | FLAG_HAS_ACCESS_DENIED):
+                    dir_tree.flags[0] |= FLAG_HAS_ACCESS_DENIED
+
+        return dir_tree.sizes[0], dir_tree
+
+    def walk_children(self, dir_tree, children):
+        """children の各ディレクトリを走査し、完了した順に (インデックス, サブツリー) を返す
+
+        サブディレクトリが少ない場合はスレッドの起動コストの方が大きいため、順に走査する。
+        """
+        if len(children) <= PARALLEL_MIN_SUBDIRS:
+            for index in children:
+                yield index, self.walk_directory(dir_tree.paths[index])
+            return
 
-        try:
-            with os.scandir(directory) as entries:
-                for entry in entries:
-                    # キャンセルチェック
+        max_workers = min(32, (os.cpu_count() or 1) * 2, len(children))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.walk_directory, dir_tree.paths[index]): index
+                for index in children
+            }
+            try:
+                for future in as_completed(futures):
+                    # 例外（キャンセルなど）はここで再送出される
+                    yield futures[future], future.result()
+            except BaseException:
+                # 例外が発生した場合は走査中のサブツリーを打ち切り、待機中のサブツリーは
+                # 開始しない（with を抜けるときに全サブツリーの完了を待たないようにする）
+                self.is_cancelled = True
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    def walk_directory(self, directory):
+        """directory 配下を走査し、サイズを集計した DirectoryTree を返す"""
+        dir_tree = DirectoryTree()
+        dir_tree.add(-1, directory)
+        self.walk_subtree(dir_tree)
+        dir_tree.accumulate()
+        return dir_tree
+
+    def walk_subtree(self, dir_tree, descend=True):
+        """dir_tree のルート配下を明示的なスタックで走査する
+
+        各ノードのサイズには直下のファイルサイズのみを設定する（集計は
+        DirectoryTree.accumulate で行う）。descend が False の場合はルート直下のみを
+        走査し、子ディレクトリはノードの追加だけを行う（走査対象のルートの走査に使用し、
+        ルートが存在しない場合などは FileNotFoundError・NotADirectoryError を送出する）。
+        """
+        timeout_enabled = self.options.get("timeout_enabled", True)
+        timeout = self.options.get("timeout", 10)
+        skip_network = self.options.get("skip_network", True)
+
+        # ループ内で参照する属性はローカル変数に束縛してインタプリタの負荷を減らす
+        scandir = os.scandir
+        now = time.monotonic
+        emit_progress = self.signals.progress.emit
+        add_node = dir_tree.add
+        check_reparse = sys.platform == "win32"
+        # Windows以外では inode 番号は scandir 時に取得済みのため、並べ替えの追加コストは小さい
+        sort_by_inode = not check_reparse
+        inode_key = os.DirEntry.inode
+        paths = dir_tree.paths
+        flags = dir_tree.flags
+        cache = self.cache
+        is_network_subdir = self.is_network_subdir
+
+        entry_count = 0
+        stack = [0]
+        push = stack.append
+
+        def add_subdir(parent, subdir):
+            """サブディレクトリのノードを追加（ネットワークドライブの配下は走査しない）"""
+            if skip_network and is_network_subdir(paths[parent], subdir):
+                add_node(parent, subdir, flags=FLAG_NETWORK_DRIVE)
+                return
+            child = add_node(parent, subdir)
+            if descend:
+                push(child)
+        while stack:
+            index = stack.pop()
+            path = paths[index]
+
+            # 更新日時が前回の走査時と同じであれば scandir を省略して結果を再利用する
+            # （ディレクトリの更新日時はエントリの追加・削除で変わるが、
+            #   既存ファイルの内容の変更では変わらない点に注意）
+            if cache is not None:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                cached = cache.get(path)
+                if mtime is not None and cached is not None and cached[0] == mtime:
                     if self.is_cancelled:
                         raise Exception("キャンセルされました")
-
-                    # タイムアウトチェック
-                    current_time = time.time()
-                    if self.options.get(
-                        "timeout_enabled", True
-                    ) and current_time - self.last_progress_time > self.options.get(
-                        "timeout", 10
-                    ):
-                        dir_structure["timeout"] = True
-                        return total_size, dir_structure
-
-                    if entry.is_dir():
-                        # サブディレクトリの場合
-                        subdir_path = entry.path
-                        try:
-                            subdir_size, subdir_structure = self.get_directory_size_py(
-                                subdir_path, False
-                            )
-                            dir_structure["children"].append(subdir_structure)
-                            total_size += subdir_size
-
-                            # アクセス拒否フラグの伝播
-                            if subdir_structure.get(
-                                "has_access_denied", False
-                            ) or subdir_structure.get("access_denied", False):
-                                dir_structure["has_access_denied"] = True
-                        except PermissionError:
-                            # アクセス拒否の場合
-                            if self.options.get("skip_access_denied", True):
-                                # アクセス拒否をスキップする場合
-                                child = {
-                                    "path": subdir_path,
-                                    "size": 0,
-                                    "children": [],
-                                    "access_denied": True,
-                                }
-                                dir_structure["children"].append(child)
-                                dir_structure["has_access_denied"] = True
-                            else:
-                                # アクセス拒否をスキップしない場合
-                                # 親ディレクトリにフラグを設定するが、サイズには影響しない
-                                child = {
-                                    "path": subdir_path,
-                                    "size": 0,
-                                    "children": [],
-                                    "access_denied": True,
-                                }
-                                dir_structure["children"].append(child)
-                                dir_structure["has_access_denied"] = True
-                    else:
-                        # ファイルの場合
-                        try:
-                            file_size = entry.stat().st_size
-                            total_size += file_size
-                        except (PermissionError, OSError):
-                            # ファイルアクセスエラーは無視
-                            pass
-
-                    # 進捗報告
-                    if report_progress:
-                        self.signals.progress.emit(directory, total_size)
-                        self.last_progress_time = time.time()
-
-        except PermissionError:
-            # アクセス拒否の場合
-            if self.options.get("skip_access_denied", True):
-                # アクセス拒否をスキップする場合
-                dir_structure["access_denied"] = True
-                dir_structure["has_access_denied"] = True
-                return 0, dir_structure
-            else:
-                # アクセス拒否をスキップしない場合
-                # 親ディレクトリにフラグを設定するが、サイズには影響しない
-                dir_structure["access_denied"] = True
-                dir_structure["has_access_denied"] = True
-                return 0, dir_structure
-
-        dir_structure["size"] = total_size
-        return total_size, dir_structure
+                    dir_tree.sizes[index] = cached[1]
+                    for subdir in cached[2]:
+                        add_subdir(index, subdir)
+                    continue
+
+            size = 0
+            subdirs = []
+
+            try:
+                with scandir(path) as entries:
+                    # inode 番号順に stat することで、inode テーブルを順に読み出せるようにする
+                    if sort_by_inode:
+                        entries = sorted(entries, key=inode_key)
+                    for entry in entries:
+                        # キャンセルチェック
+                        if self.is_cancelled:
+                            raise Exception("キャンセルされました")
+
+                        # タイムアウトチェックと進捗報告は TIME_CHECK_INTERVAL 件ごとに行う
+                        entry_count += 1
+                        if not entry_count % TIME_CHECK_INTERVAL:
+                            current_time = now()
+                            if (
+                                timeout_enabled
+                                and current_time - self.last_progress_time > timeout
+                            ):
+                                flags[index] |= FLAG_TIMEOUT
+                                break
+
+                            # シグナルの送出はさらに一定間隔に間引く
+                            self.last_progress_time = current_time
+                            if (
+                                current_time - self.last_emit_time
+                                >= PROGRESS_EMIT_INTERVAL
+                            ):
+                                self.last_emit_time = current_time
+                                emit_progress(path, size)
+
+                        if entry.is_dir(follow_symlinks=False):
+                            # ジャンクションなどのリパースポイントは循環の恐れがあるため辿らない
+                            # （Windowsでは stat の結果は scandir 時に取得済み）
+                            if (
+                                check_reparse
+                                and entry.stat(follow_symlinks=False).st_file_attributes
+                                & stat.FILE_ATTRIBUTE_REPARSE_POINT
+                            ):
+                                continue
+
+                            # サブディレクトリは後で処理する
+                            subdirs.append(entry.path)
+                            add_subdir(index, entry.path)
+                        else:
+                            # ファイルの場合（scandirがキャッシュした情報を使用）
+                            # ディレクトリでなければ is_file() は確認せず、stat は1回だけ取得する
+                            # シンボリックリンクはリンク自体のサイズを加算する
+                            try:
+                                st = entry.stat(follow_symlinks=False)
+                                size += st.st_size
+                            except OSError:
+                                # ファイルアクセスエラーは無視
+                                pass
+
+            except PermissionError:
+                # アクセス拒否の場合、サイズは0として親ディレクトリにフラグを伝播
+                flags[index] |= FLAG_ACCESS_DENIED | FLAG_HAS_ACCESS_DENIED
+            except (FileNotFoundError, NotADirectoryError):
+                # 走査中に削除・置き換えられたサブディレクトリはスキップする
+                # （走査対象のルート自体が無効な場合のみ呼び出し元に通知する）
+                if index == 0 and not descend:
+                    raise
+                continue
+
+            dir_tree.sizes[index] = size
+
+            # 最後まで走査できたディレクトリのみ結果を記録
+            if (
+                cache is not None
+                and mtime is not None
+                and not flags[index] & (FLAG_TIMEOUT | FLAG_ACCESS_DENIED)
+            ):
+                cache[path] = (mtime, size, tuple(subdirs))
+
+
+class NameItem(QStandardItem):
+    """名前表示用のアイテムクラス（ソート用のデータに表示名を設定）"""
+
+    def __init__(self, name):
+        """アイテムの初期化"""
+        super().__init__(name)
+        self.setData(name, SORT_ROLE)
 
 
 class SizeItem(QStandardItem):
-    """サイズ表示用のカスタムアイテムクラス"""
+    """サイズ表示用のカスタムアイテムクラス
+
+    ソートは Python の比較演算子を使わず、SORT_ROLE に設定した
+    浮動小数点数の値を Qt 側で比較して行う。
+    """
 
     def __init__(self, size_bytes):
         """アイテムの初期化"""
         self.size_bytes = size_bytes
         size_str = self.format_size(size_bytes)
         super().__init__(size_str)
+        # 整数のままでは値の大きさによって QVariant の型（int/qlonglong など）が変わり、
+        # 型の異なる値どうしが正しく比較されないため、すべて float にそろえる
+        self.setData(float(size_bytes), SORT_ROLE)
 
-    def format_size(self, size_bytes):
+    @staticmethod
+    def format_size(size_bytes):
         """バイト数を読みやすい形式に変換"""
         if size_bytes == 0:
             return "0 B"
 
         # アクセス拒否値の場合
-        if RUST_AVAILABLE and size_bytes == rust_lib.get_access_denied_value():
+        if size_bytes == ACCESS_DENIED_VALUE:
             return "アクセス拒否"
 
-        units = ["B", "KB", "MB", "GB", "TB", "PB"]
-        i = 0
-        size = float(size_bytes)
+        # ビット長から単位を決定（1024 = 2**10 ごとに単位が1つ上がる）
+        unit = min((size_bytes.bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+        return f"{size_bytes / (1 << (unit * 10)):.2f} {SIZE_UNITS[unit]}"
 
-        while size >= 1024 and i < len(units) - 1:
-            size /= 1024
-            i += 1
 
-        return f"{size:.2f} {units[i]}"
+class DirectoryItemModel(QStandardItemModel):
+    """子の行を展開時に追加するツリー用のモデル
 
-    def __lt__(self, other):
-        """ソート用の比較演算子"""
-        if isinstance(other, SizeItem):
-            return self.size_bytes < other.size_bytes
-        return super().__lt__(other)
+    子の行をまだ追加していないアイテム（NODE_ROLE にノードのインデックスを持つ）も
+    子を持つものとして扱い、ダミーの行を作らずに展開できるようにする。
+    """
+
+    def hasChildren(self, parent=QModelIndex()):
+        """子を持つかどうか（未展開のアイテムは NODE_ROLE で判定）"""
+        if parent.isValid() and parent.data(NODE_ROLE) is not None:
+            return True
+        return super().hasChildren(parent)
 
 
 class DirectorySizeViewer(QMainWindow):
@@ -535,8 +740,12 @@ class DirectorySizeViewer(QMainWindow):
             "skip_box": True,  # Box Driveをスキップするかどうか
             "skip_cloud": True,  # その他のクラウドストレージをスキップするかどうか
             "skip_access_denied": True,  # アクセス拒否ディレクトリをスキップするかどうか
+            "use_cache": False,  # 前回の走査結果を再利用するかどうか（概算の高速な再解析）
         }
 
+        # 走査結果のキャッシュ（{パス: (更新日時, 直下のファイルサイズ合計, サブディレクトリ)}）
+        self.scan_cache = {}
+
         # スレッドプールの設定
         self.thread_pool = QThreadPool()
         print(f"スレッド数: {self.thread_pool.maxThreadCount()}")
@@ -544,16 +753,17 @@ class DirectorySizeViewer(QMainWindow):
         # 現在のワーカー
         self.current_worker = None
 
+        # 表示中の解析結果（ノードごとの子ノードの一覧）
+        self.dir_tree = None
+        self.tree_children = []
+
         # タイムアウト監視用タイマー
         self.timeout_timer = QTimer(self)
         self.timeout_timer.timeout.connect(self.check_timeout)
         self.last_progress_time = 0
 
         # アクセス拒否値の取得
-        if RUST_AVAILABLE:
-            self.access_denied_value = rust_lib.get_access_denied_value()
-        else:
-            self.access_denied_value = 2**64 - 1  # u64::MAX
+        self.access_denied_value = ACCESS_DENIED_VALUE
 
         # UIの設定
         self.setup_ui()
@@ -607,11 +817,15 @@ class DirectorySizeViewer(QMainWindow):
         self.tree_view.setEditTriggers(QTreeView.EditTrigger.NoEditTriggers)
         self.tree_view.setSelectionBehavior(QTreeView.SelectionBehavior.SelectRows)
         self.tree_view.setMinimumHeight(400)
+        # 全行が同じ高さのため、行ごとの高さの計算を省略する
+        self.tree_view.setUniformRowHeights(True)
+        self.tree_view.expanded.connect(self.on_item_expanded)
         main_layout.addWidget(self.tree_view)
 
         # モデルの設定
-        self.model = QStandardItemModel(0, 2)
+        self.model = DirectoryItemModel(0, 2)
         self.model.setHorizontalHeaderLabels(["名前", "サイズ"])
+        self.model.setSortRole(SORT_ROLE)
         self.tree_view.setModel(self.model)
 
         # 進捗バー
@@ -702,10 +916,28 @@ class DirectorySizeViewer(QMainWindow):
         cloud_checkbox.setChecked(self.options.get("skip_cloud", True))
         skip_layout.addWidget(cloud_checkbox)
 
+        # キャッシュ設定
+        cache_group = QGroupBox("キャッシュ設定")
+        cache_layout = QVBoxLayout()
+        cache_group.setLayout(cache_layout)
+
+        cache_checkbox = QCheckBox(
+            "高速な再解析（概算）: 更新日時が変わっていないディレクトリは前回の結果を再利用する"
+        )
+        cache_checkbox.setToolTip(
+            "ファイルの内容を書き換えてもディレクトリの更新日時は変わらないため、"
+            "サイズの変化が反映されない場合があります。"
+        )
+        cache_checkbox.setChecked(self.options.get("use_cache", False))
+        cache_layout.addWidget(cache_checkbox)
+        # キャッシュはPython実装の走査でのみ使用するため、Rust実装では表示しない
+        cache_group.setVisible(not RUST_AVAILABLE)
+
         # レイアウトに追加
         dialog_layout.addWidget(timeout_group)
         dialog_layout.addWidget(depth_group)
         dialog_layout.addWidget(skip_group)
+        dialog_layout.addWidget(cache_group)
 
         # ボタンの設定
         button_box = QDialogButtonBox(
@@ -727,6 +959,9 @@ class DirectorySizeViewer(QMainWindow):
             self.options["skip_network"] = network_checkbox.isChecked()
             self.options["skip_box"] = box_checkbox.isChecked()
             self.options["skip_cloud"] = cloud_checkbox.isChecked()
+            self.options["use_cache"] = cache_checkbox.isChecked()
+            if not self.options["use_cache"]:
+                self.scan_cache.clear()
 
     def browse_directory(self):
         """ディレクトリ選択ダイアログを表示"""
@@ -741,10 +976,6 @@ class DirectorySizeViewer(QMainWindow):
             QMessageBox.warning(self, "警告", "ディレクトリを選択してください")
             return
 
-        if not os.path.isdir(directory):
-            QMessageBox.warning(self, "警告", "有効なディレクトリを選択してください")
-            return
-
         # UIの状態を更新
         self.analyze_button.setEnabled(False)
         self.browse_button.setEnabled(False)
@@ -752,12 +983,18 @@ class DirectorySizeViewer(QMainWindow):
         self.cancel_button.setEnabled(True)
         self.progress_bar.setVisible(True)
 
-        # モデルをクリア
+        # モデルと前回の解析結果をクリア
         self.model.removeRows(0, self.model.rowCount())
+        self.dir_tree = None
+        self.tree_children = []
 
         # ワーカーの作成と実行
-        self.current_worker = DirectorySizeWorker(directory, self.options)
+        # キャッシュはPython実装の走査でのみ使用する
+        use_cache = self.options.get("use_cache", False) and not RUST_AVAILABLE
+        cache = self.scan_cache if use_cache else None
+        self.current_worker = DirectorySizeWorker(directory, self.options, cache)
         self.current_worker.signals.result.connect(self.update_tree)
+        self.current_worker.signals.partial.connect(self.add_partial_result)
         self.current_worker.signals.error.connect(self.show_error)
         self.current_worker.signals.warning.connect(self.show_warning)
         self.current_worker.signals.finished.connect(self.on_worker_finished)
@@ -795,16 +1032,39 @@ class DirectorySizeViewer(QMainWindow):
             self.status_bar.showMessage("キャンセル中...")
             self.timeout_timer.stop()
 
+    def add_partial_result(self, results):
+        """解析中に完了したサブディレクトリ [(パス, サイズ), ...] を仮の行として表示"""
+        if not self.current_worker:
+            return
+
+        # 最初の途中結果で仮のルート行を作成
+        if self.model.rowCount() == 0:
+            root_path = self.current_worker.directory
+            root_name = os.path.basename(root_path) or root_path
+            root_item = NameItem(f"{root_name} (解析中...)")
+            self.model.appendRow([root_item, QStandardItem()])
+            self.tree_view.expand(self.model.indexFromItem(root_item))
+
+        # まとめて追加し、ソートは追加後に1回だけ行う
+        root_item = self.model.item(0)
+        self.tree_view.setSortingEnabled(False)
+        for path, size in results:
+            root_item.appendRow([NameItem(os.path.basename(path)), SizeItem(size)])
+        self.tree_view.setSortingEnabled(True)
+
     def update_tree(self, result):
         """ディレクトリツリーの更新"""
+        # 途中結果の行を削除
+        self.model.removeRows(0, self.model.rowCount())
+
         # 結果の取得
         total_size = result["total_size"]
-        dir_structure = result["dir_structure"]
+        dir_tree = result["dir_tree"]
         elapsed_time = result["elapsed_time"]
         has_access_denied = result.get("has_access_denied", False)
 
         # ルートアイテムの作成
-        root_path = dir_structure["path"]
+        root_path = dir_tree.paths[0]
         root_name = os.path.basename(root_path) or root_path
 
         # アクセス拒否がある場合は表示に追加
@@ -812,19 +1072,26 @@ class DirectorySizeViewer(QMainWindow):
         if has_access_denied:
             display_name = f"{root_name} (一部アクセス拒否あり)"
 
-        root_item = QStandardItem(display_name)
+        root_item = NameItem(display_name)
         size_item = SizeItem(total_size)
 
-        # モデルにルートアイテムを追加
-        self.model.appendRow([root_item, size_item])
+        # 子ディレクトリの行は展開時に1階層ずつ追加する
+        self.dir_tree = dir_tree
+        self.tree_children = dir_tree.children_lists()
 
-        # 子ディレクトリを再帰的に追加
-        self.add_directory_to_tree(dir_structure, root_item)
+        # モデルから切り離した状態でルート直下の子ディレクトリを追加
+        # （追加のたびにモデルのシグナルやビューの再レイアウトが発生しないようにする）
+        self.add_directory_to_tree(root_item, 0)
+
+        # 構築したツリーをソートを止めた状態でモデルに一括追加
+        self.tree_view.setSortingEnabled(False)
+        self.model.appendRow([root_item, size_item])
+        self.tree_view.setSortingEnabled(True)
 
         # ツリーを展開
         self.tree_view.expand(self.model.indexFromItem(root_item))
 
-        # カラムのリサイズ
+        # カラムのリサイズ（全行の追加後に1回だけ行う）
         self.tree_view.resizeColumnToContents(0)
 
         # ステータスバーの更新
@@ -839,40 +1106,47 @@ class DirectorySizeViewer(QMainWindow):
 
         self.status_bar.showMessage(status)
 
-    def add_directory_to_tree(self, dir_info, parent_item):
-        """ディレクトリ情報をツリーに再帰的に追加"""
-        # 子ディレクトリを追加
-        for child in dir_info.get("children", []):
-            dir_path = child["path"]
-            dir_name = os.path.basename(dir_path)
-            dir_size = child["size"]
-
-            # 特殊状態の表示
-            display_name = dir_name
-            if child.get("access_denied", False):
-                display_name = f"{dir_name} (アクセス拒否)"
-            elif child.get("timeout", False):
-                display_name = f"{dir_name} (タイムアウト)"
-            elif child.get("depth_limited", False):
-                display_name = f"{dir_name} (深さ制限)"
-            elif child.get("network_drive", False):
-                display_name = f"{dir_name} (ネットワークドライブ - スキップ)"
-            elif child.get("box_drive", False):
-                display_name = f"{dir_name} (Box Drive - スキップ)"
-            elif child.get("cloud_storage", False):
-                display_name = f"{dir_name} (クラウドストレージ - スキップ)"
-            elif child.get("error", False):
-                display_name = f"{dir_name} (エラー: {child['error']})"
-
-            name_item = QStandardItem(display_name)
-            size_item = SizeItem(dir_size)
+    def add_directory_to_tree(self, parent_item, node):
+        """ノード node の子ディレクトリの行を parent_item に追加
+
+        孫以降の行は追加せず、子を持つ行にはノードのインデックスを設定しておき、
+        展開されたときに on_item_expanded で追加する。
+        """
+        dir_tree = self.dir_tree
+        tree_children = self.tree_children
+
+        for index in tree_children[node]:
+            # 特殊状態の表示（フラグの値から接尾辞を引く）
+            dir_name = os.path.basename(dir_tree.paths[index])
+            display_name = dir_name + DISPLAY_SUFFIXES[dir_tree.flags[index]]
+
+            name_item = NameItem(display_name)
+            size_item = SizeItem(dir_tree.sizes[index])
+
+            # 子ディレクトリがある場合はノードのインデックスを設定（モデルが子ありとして扱う）
+            if tree_children[index]:
+                name_item.setData(index, NODE_ROLE)
 
             # 親アイテムに追加
             parent_item.appendRow([name_item, size_item])
 
-            # 子ディレクトリがある場合は再帰的に追加
-            if child.get("children") and len(child["children"]) > 0:
-                self.add_directory_to_tree(child, name_item)
+    def on_item_expanded(self, index):
+        """展開されたアイテムの子ディレクトリの行を追加"""
+        item = self.model.itemFromIndex(index)
+        if item is None:
+            return
+
+        node = item.data(NODE_ROLE)
+        if node is None:
+            return
+
+        # 子ディレクトリの行を追加
+        item.setData(None, NODE_ROLE)
+        self.add_directory_to_tree(item, node)
+
+        # 現在のソート順に合わせる
+        header = self.tree_view.header()
+        item.sortChildren(header.sortIndicatorSection(), header.sortIndicatorOrder())
 
     def update_progress(self, path, size):
         """進捗状況の更新"""
@@ -900,6 +1174,10 @@ class DirectorySizeViewer(QMainWindow):
         # タイムアウト監視の停止
         self.timeout_timer.stop()
 
+        # 結果が届かなかった場合（キャンセル・エラー）は途中結果の仮の行を削除
+        if self.dir_tree is None:
+            self.model.removeRows(0, self.model.rowCount())
+
         # UIの状態をリセット
         self.analyze_button.setEnabled(True)
         self.browse_button.setEnabled(True)
@@ -931,68 +1209,24 @@ class DirectorySizeViewer(QMainWindow):
     def is_network_drive_basic(self, path):
         """基本的なネットワークドライブチェック"""
         # UNCパス
-        if re.match(r"^\\\\", path):
+        if path.startswith(UNC_PREFIXES):
             return True
 
         # マウントされたネットワークドライブ
-        if sys.platform == "win32":
+        if win32file is not None:
             drive_letter = os.path.splitdrive(path)[0]
             if drive_letter:
-                try:
-                    import win32file
-
-                    drive_type = win32file.GetDriveType(drive_letter)
-                    return drive_type == win32file.DRIVE_REMOTE
-                except ImportError:
-                    pass
+                return is_remote_drive(drive_letter)
 
         return False
 
     def is_box_drive(self, path):
         """Box Driveかどうかを判定"""
-        box_patterns = [
-            r"\\Box\\",
-            r"/Box/",
-            r"\\BoxSync\\",
-            r"/BoxSync/",
-            r"\\Box Sync\\",
-            r"/Box Sync/",
-            r"\\BoxDrive\\",
-            r"/BoxDrive/",
-            r"\\Box Drive\\",
-            r"/Box Drive/",
-        ]
-        for pattern in box_patterns:
-            if re.search(pattern, path, re.IGNORECASE):
-                return True
-        return False
+        return BOX_DRIVE_PATTERN.search(path) is not None
 
     def is_cloud_storage(self, path):
         """その他のクラウドストレージかどうかを判定"""
-        cloud_patterns = [
-            # OneDrive
-            r"\\OneDrive\\",
-            r"/OneDrive/",
-            r"\\OneDrive - ",
-            r"/OneDrive - ",
-            # Dropbox
-            r"\\Dropbox\\",
-            r"/Dropbox/",
-            # Google Drive
-            r"\\Google Drive\\",
-            r"/Google Drive/",
-            r"\\GoogleDrive\\",
-            r"/GoogleDrive/",
-            # iCloud
-            r"\\iCloud Drive\\",
-            r"/iCloud Drive/",
-            r"\\iCloudDrive\\",
-            r"/iCloudDrive/",
-        ]
-        for pattern in cloud_patterns:
-            if re.search(pattern, path, re.IGNORECASE):
-                return True
-        return False
+        return CLOUD_STORAGE_PATTERN.search(path) is not None
 
 
 def main():
@@ -24,11 +24,10 @@ try:
     access_denied = rust_lib.get_access_denied_value()
     print(f"アクセス拒否値: {access_denied}")
 
-    # キャンセルフラグのテスト
-    cancel_ptr = rust_lib.create_cancel_flag()
-    print(f"キャンセルフラグポインタ: {cancel_ptr}")
-    rust_lib.release_cancel_flag(cancel_ptr)
-    print("キャンセルフラグを解放しました")
+    # キャンセルトークンのテスト
+    cancel_token = rust_lib.CancelToken()
+    cancel_token.set()
+    print(f"キャンセルトークン: キャンセル要求={cancel_token.is_set()}")
 
 except ImportError as e:
     print(f"\n警告: Rustライブラリのインポートに失敗しました: {e}")
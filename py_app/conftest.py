@@ -0,0 +1,22 @@
+"""
+Directory Size Viewerのテスト用の共通フィクスチャ
+"""
+
+import pytest
+
+# 手動実行用のスクリプト（ホームディレクトリを走査するため収集対象から外す）
+collect_ignore = ["gui_feature_test.py"]
+
+
+# Rustライブラリのインポート
+@pytest.fixture(scope="session")
+def rust_lib():
+    """Rustライブラリを提供するフィクスチャ（利用できない場合はスキップ）"""
+    return pytest.importorskip("rust_lib")
+
+
+
+@pytest.fixture
+def cancel_token(rust_lib):
+    """テストごとに新しいキャンセルトークンを提供するフィクスチャ"""
+    return rust_lib.CancelToken()
@@ -52,25 +52,23 @@ def test_progress_reporting():
 
     print(f"ディレクトリ: {path}")
 
-    # キャンセルフラグの作成
-    cancel_ptr = rust_lib.create_cancel_flag()
+    # キャンセルトークンの作成（オブジェクトの破棄とともに解放される）
+    cancel_token = rust_lib.CancelToken()
 
     try:
         start_time = time.time()
-        size = rust_lib.get_dir_size_with_cancel_py(path, cancel_ptr, progress_callback)
+        size, access_denied = rust_lib.get_dir_size_with_cancel_py(
+            path, cancel_token, progress_callback
+        )
         elapsed = time.time() - start_time
 
-        if size == rust_lib.get_access_denied_value():
-            print(f"結果: 一部のサブディレクトリにアクセスできませんでした")
-        else:
-            print(f"結果: {size} バイト ({size / (1024*1024):.2f} MB)")
+        print(f"結果: {size} バイト ({size / (1024*1024):.2f} MB)")
+        if access_denied:
+            print(f"一部のサブディレクトリにアクセスできませんでした")
 
         print(f"処理時間: {elapsed:.2f} 秒")
     except Exception as e:
         print(f"エラー: {e}")
-    finally:
-        # キャンセルフラグの解放
-        rust_lib.release_cancel_flag(cancel_ptr)
 
 
 def test_cancellation():
@@ -81,8 +79,8 @@ def test_cancellation():
     path = os.path.expanduser("~")  # ホームディレクトリ
     print(f"ディレクトリ: {path}")
 
-    # キャンセルフラグの作成
-    cancel_ptr = rust_lib.create_cancel_flag()
+    # キャンセルトークンの作成（オブジェクトの破棄とともに解放される）
+    cancel_token = rust_lib.CancelToken()
 
     # 別スレッドで少し待ってからキャンセル
     import threading
@@ -90,13 +88,15 @@ def test_cancellation():
     def cancel_after_delay():
         time.sleep(0.5)  # 0.5秒後にキャンセル
         print("\n処理をキャンセルします...")
-        rust_lib.set_cancel_flag(cancel_ptr, True)
+        cancel_token.set()
 
     threading.Thread(target=cancel_after_delay).start()
 
     try:
         start_time = time.time()
-        size = rust_lib.get_dir_size_with_cancel_py(path, cancel_ptr, progress_callback)
+        size, _ = rust_lib.get_dir_size_with_cancel_py(
+            path, cancel_token, progress_callback
+        )
         elapsed = time.time() - start_time
 
         print(f"結果: {size} バイト ({size / (1024*1024):.2f} MB)")
@@ -105,9 +105,6 @@ def test_cancellation():
         elapsed = time.time() - start_time
         print(f"エラー: {e}")
         print(f"キャンセルまでの時間: {elapsed:.2f} 秒")
-    finally:
-        # キャンセルフラグの解放
-        rust_lib.release_cancel_flag(cancel_ptr)
 
 
 def test_error_handling():
@@ -10,74 +10,53 @@ import sys
 import time
 import pytest
 import tempfile
-import shutil
-from pathlib import Path
-
-# Rustライブラリのインポート
-try:
-    import rust_lib
-
-    RUST_AVAILABLE = True
-    print("Rustライブラリが正常にインポートされました")
-except ImportError as e:
-    RUST_AVAILABLE = False
-    print(f"警告: Rustライブラリのインポートに失敗しました: {e}")
-
 
 # テスト用のディレクトリ構造を作成
 @pytest.fixture
-def test_directory():
-    """テスト用のディレクトリ構造を作成して提供するフィクスチャ"""
-    # 一時ディレクトリの作成
-    temp_dir = tempfile.mkdtemp()
+def test_directory(tmp_path):
+    """テスト用のディレクトリ構造を作成して提供するフィクスチャ
 
-    try:
-        # サブディレクトリの作成
-        for i in range(5):
-            subdir = os.path.join(temp_dir, f"subdir_{i}")
-            os.makedirs(subdir)
-
-            # ファイルの作成
-            for j in range(3):
-                file_path = os.path.join(subdir, f"file_{j}.txt")
-                with open(file_path, "w") as f:
-                    # 異なるサイズのファイルを作成
-                    f.write("x" * (1024 * (i + 1) * (j + 1)))
-
-        yield temp_dir
-    finally:
-        # テスト後にディレクトリを削除
-        shutil.rmtree(temp_dir)
+    pytest の tmp_path の下に作成し、削除は pytest に任せる。
+    """
+    # サブディレクトリの作成
+    for i in range(5):
+        subdir = tmp_path / f"subdir_{i}"
+        subdir.mkdir()
+
+        # ファイルの作成（内容は書き込まず、ftruncateで異なるサイズに伸ばす）
+        for j in range(3):
+            fd = os.open(subdir / f"file_{j}.txt", os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, 1024 * (i + 1) * (j + 1))
+            finally:
+                os.close(fd)
+
+    return str(tmp_path)
 
 
 # Rustライブラリのテスト
-@pytest.mark.skipif(not RUST_AVAILABLE, reason="Rustライブラリが利用できません")
-def test_rust_dir_size(test_directory):
+def test_rust_dir_size(rust_lib, test_directory):
     """Rustライブラリのディレクトリサイズ計算をテスト"""
     # 基本的なサイズ計算
-    size = rust_lib.get_dir_size_py(test_directory)
+    size, access_denied = rust_lib.get_dir_size_py(test_directory)
     assert size > 0, "ディレクトリサイズは0より大きいはずです"
+    assert not access_denied
+
+
+# サブディレクトリごとのサイズ計算のテスト
+@pytest.mark.parametrize("index", range(5))
+def test_rust_subdir_size(rust_lib, test_directory, index):
+    """Rustライブラリのサブディレクトリのサイズ計算をテスト"""
+    subdir = os.path.join(test_directory, f"subdir_{index}")
+    size, _ = rust_lib.get_dir_size_py(subdir)
 
-    # サブディレクトリのサイズ計算
-    subdirs = [
-        os.path.join(test_directory, d)
-        for d in os.listdir(test_directory)
-        if os.path.isdir(os.path.join(test_directory, d))
-    ]
-    for subdir in subdirs:
-        subdir_size = rust_lib.get_dir_size_py(subdir)
-        assert (
-            subdir_size > 0
-        ), f"サブディレクトリ {subdir} のサイズは0より大きいはずです"
+    # subdir_i のファイルサイズは 1024 * (i + 1) * (j + 1) (j = 0..2)
+    assert size == 1024 * (index + 1) * 6
 
 
 # キャンセル機能のテスト
-@pytest.mark.skipif(not RUST_AVAILABLE, reason="Rustライブラリが利用できません")
-def test_rust_cancellation(test_directory):
+def test_rust_cancellation(rust_lib, cancel_token, test_directory):
     """Rustライブラリのキャンセル機能をテスト"""
-    # キャンセルフラグの作成
-    cancel_ptr = rust_lib.create_cancel_flag()
-
     # 進捗コールバック
     progress_calls = []
 
@@ -85,78 +64,395 @@ def test_rust_cancellation(test_directory):
         progress_calls.append((path, size))
         # 数回呼び出された後にキャンセル
         if len(progress_calls) >= 5:
-            rust_lib.set_cancel_flag(cancel_ptr, True)
-
-    try:
-        # キャンセルされることを期待
-        with pytest.raises(Exception) as excinfo:
-            rust_lib.get_dir_size_with_cancel_py(
-                test_directory, cancel_ptr, progress_callback
-            )
+            cancel_token.set()
 
-        # キャンセルエラーメッセージの確認
-        assert "キャンセルされました" in str(excinfo.value)
+    # キャンセルされることを期待
+    with pytest.raises(rust_lib.CancelledError):
+        rust_lib.get_dir_size_with_cancel_py(
+            test_directory, cancel_token, progress_callback
+        )
 
-        # 進捗コールバックが呼ばれたことを確認
-        assert len(progress_calls) >= 5
-    finally:
-        # キャンセルフラグの解放
-        rust_lib.release_cancel_flag(cancel_ptr)
+    # 進捗コールバックが呼ばれたことを確認
+    assert len(progress_calls) >= 5
 
 
 # 進捗報告のテスト
-@pytest.mark.skipif(not RUST_AVAILABLE, reason="Rustライブラリが利用できません")
-def test_rust_progress_reporting(test_directory):
+def test_rust_progress_reporting(rust_lib, cancel_token, test_directory):
     """Rustライブラリの進捗報告機能をテスト"""
-    # キャンセルフラグの作成
-    cancel_ptr = rust_lib.create_cancel_flag()
-
     # 進捗コールバック
     progress_calls = []
 
     def progress_callback(path, size):
         progress_calls.append((path, size))
 
-    try:
-        # ディレクトリサイズの計算
-        size = rust_lib.get_dir_size_with_cancel_py(
-            test_directory, cancel_ptr, progress_callback
+    # ディレクトリサイズの計算
+    size, access_denied = rust_lib.get_dir_size_with_cancel_py(
+        test_directory, cancel_token, progress_callback
+    )
+
+    # サイズが正しく計算されたことを確認
+    assert size > 0
+    assert not access_denied
+
+    # 進捗コールバックが呼ばれたことを確認
+    assert len(progress_calls) > 0
+
+    # 進捗報告の内容を確認（ディレクトリは走査の開始時にサイズ0で報告される）
+    for path, reported_size in progress_calls:
+        assert isinstance(path, str)
+        assert isinstance(reported_size, int)
+        assert reported_size >= 0
+
+    # ディレクトリの最後の報告は配下の合計サイズ
+    last_sizes = dict(progress_calls)
+    for i in range(5):
+        subdir = os.path.join(test_directory, f"subdir_{i}")
+        assert last_sizes[subdir] == 1024 * (i + 1) * 6
+
+
+# ツリー構築のテスト
+def test_rust_build_dir_tree(rust_lib, cancel_token, test_directory):
+    """Rustライブラリのツリー構築機能をテスト"""
+    partials = []
+    nodes = rust_lib.build_dir_tree_with_cancel_py(
+        test_directory,
+        cancel_token,
+        lambda path, size: None,
+        lambda path, size: partials.append((path, size)),
+    )
+
+    # ルート + サブディレクトリ5つ
+    assert len(nodes) == 6
+    root_parent, root_path, root_size, _, _ = nodes[0]
+    assert root_parent is None
+    assert root_path == test_directory
+
+    # サブディレクトリのサイズの合計がルートのサイズと一致することを確認
+    children = [node for node in nodes if node[0] == 0]
+    assert len(children) == 5
+    assert sum(node[2] for node in children) == root_size
+
+    # 完了したサブディレクトリごとに途中結果が通知されることを確認
+    assert sorted(partials) == sorted((node[1], node[2]) for node in children)
+
+
+# キャンセルトークンのテスト
+def test_rust_cancel_token(rust_lib, cancel_token, test_directory):
+    """キャンセルトークンによるツリー構築のキャンセルをテスト"""
+    assert not cancel_token.is_set()
+
+    cancel_token.set()
+    assert cancel_token.is_set()
+
+    with pytest.raises(rust_lib.CancelledError):
+        rust_lib.build_dir_tree_with_cancel_py(
+            test_directory, cancel_token, lambda path, size: None
         )
 
-        # サイズが正しく計算されたことを確認
-        assert size > 0
-
-        # 進捗コールバックが呼ばれたことを確認
-        assert len(progress_calls) > 0
-
-        # 進捗報告の内容を確認
-        for path, size in progress_calls:
-            assert isinstance(path, str)
-            assert isinstance(size, int)
-            assert size > 0
-    finally:
-        # キャンセルフラグの解放
-        rust_lib.release_cancel_flag(cancel_ptr)
-
 
 # エラーハンドリングのテスト
-@pytest.mark.skipif(not RUST_AVAILABLE, reason="Rustライブラリが利用できません")
-def test_rust_error_handling():
+def test_rust_error_handling(rust_lib):
     """Rustライブラリのエラーハンドリングをテスト"""
     # 存在しないディレクトリ
     non_existent_dir = "/path/to/non/existent/directory"
 
     # エラーが発生することを期待
-    with pytest.raises(Exception) as excinfo:
+    with pytest.raises(OSError):
         rust_lib.get_dir_size_py(non_existent_dir)
 
-    # エラーメッセージの確認
-    assert "I/Oエラー" in str(excinfo.value)
-
 
 # アクセス拒否値のテスト
-@pytest.mark.skipif(not RUST_AVAILABLE, reason="Rustライブラリが利用できません")
-def test_access_denied_value():
+def test_access_denied_value(rust_lib):
     """アクセス拒否値の取得をテスト"""
     value = rust_lib.get_access_denied_value()
     assert value == 2**64 - 1  # u64::MAX
+
+
+# Python実装のテスト
+def test_python_dir_size(test_directory):
+    """Python実装のディレクトリサイズ計算をテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    worker = DirectorySizeWorker(test_directory, {"skip_network": False})
+    total_size, dir_tree = worker.get_directory_size_py(test_directory)
+
+    # 作成したファイルサイズの合計と一致することを確認
+    expected = sum(1024 * (i + 1) * (j + 1) for i in range(5) for j in range(3))
+    assert total_size == expected
+    assert dir_tree.sizes[0] == expected
+
+    # ルート + サブディレクトリ5つ
+    assert len(dir_tree) == 6
+    assert list(dir_tree.parents[1:]) == [0] * 5
+    assert sum(dir_tree.sizes[1:]) == expected
+
+
+# サイズ表示のテスト
+@pytest.mark.parametrize(
+    "size_bytes, expected",
+    [
+        (0, "0 B"),
+        (1, "1.00 B"),
+        (1023, "1023.00 B"),
+        (1024, "1.00 KB"),
+        (1536, "1.50 KB"),
+        (1024**2, "1.00 MB"),
+        (5 * 1024**3, "5.00 GB"),
+        (1024**6, "1024.00 PB"),
+        (2**64 - 1, "アクセス拒否"),
+    ],
+)
+def test_format_size(size_bytes, expected):
+    """バイト数の表示形式をテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import SizeItem
+
+    assert SizeItem.format_size(size_bytes) == expected
+
+
+# サイズによるソートのテスト
+def test_size_item_sort_order():
+    """4 GiB を超えるサイズを含めてサイズ順にソートされることをテスト"""
+    pytest.importorskip("PyQt6")
+    from PyQt6.QtCore import Qt
+    from Directory_Size_Viewer import SORT_ROLE, DirectoryItemModel, SizeItem
+
+    sizes = [5, 3 * 10**9, 100, 2**40, 0, 2**64 - 1, 2**32]
+    model = DirectoryItemModel(0, 1)
+    model.setSortRole(SORT_ROLE)
+    for size in sizes:
+        model.appendRow([SizeItem(size)])
+
+    model.sort(0, Qt.SortOrder.AscendingOrder)
+    assert [model.item(row).size_bytes for row in range(len(sizes))] == sorted(sizes)
+
+
+# 走査結果のキャッシュのテスト
+def test_python_dir_size_cache(test_directory):
+    """Python実装で前回の走査結果が再利用されることをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    cache = {}
+    options = {"skip_network": False}
+    first_size, first_tree = DirectorySizeWorker(
+        test_directory, options, cache
+    ).get_directory_size_py(test_directory)
+
+    # ルート + サブディレクトリ5つが記録される
+    assert len(cache) == 6
+
+    # 記録内容を書き換え、更新日時が同じなら再利用されることを確認
+    subdir = os.path.join(test_directory, "subdir_0")
+    mtime, size, subdirs = cache[subdir]
+    cache[subdir] = (mtime, size + 1, subdirs)
+    second_size, second_tree = DirectorySizeWorker(
+        test_directory, options, cache
+    ).get_directory_size_py(test_directory)
+    assert second_size == first_size + 1
+    assert sorted(second_tree.paths) == sorted(first_tree.paths)
+
+
+# 並列走査中のエラーのテスト
+def test_python_walk_children_stops_on_error():
+    """サブツリーの走査でエラーが発生した場合、残りのサブツリーを走査しないことをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker, DirectoryTree
+
+    dir_tree = DirectoryTree()
+    dir_tree.add(-1, "root")
+    for i in range(100):
+        dir_tree.add(0, f"root/d{i:02}")
+
+    worker = DirectorySizeWorker("root", {})
+    started = []
+
+    def walk_directory(directory):
+        started.append(directory)
+        if directory == "root/d00":
+            raise RuntimeError("走査エラー")
+        # キャンセルされるまで（最大0.2秒）走査中の状態を保つ
+        deadline = time.monotonic() + 0.2
+        while not worker.is_cancelled and time.monotonic() < deadline:
+            time.sleep(0.001)
+        raise Exception("キャンセルされました")
+
+    worker.walk_directory = walk_directory
+
+    with pytest.raises(RuntimeError):
+        for _ in worker.walk_children(dir_tree, range(1, len(dir_tree))):
+            pass
+
+    assert worker.is_cancelled
+    assert len(started) < 100
+
+
+# 走査中に削除されたサブディレクトリのテスト
+def test_python_dir_size_vanished_subdir(test_directory, monkeypatch):
+    """走査中に削除されたサブディレクトリをスキップして走査を続けることをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    vanished = os.path.join(test_directory, "subdir_2")
+    scandir = os.scandir
+
+    def fake_scandir(path):
+        if path == vanished:
+            raise FileNotFoundError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", fake_scandir)
+
+    worker = DirectorySizeWorker(test_directory, {"skip_network": False})
+    total_size, dir_tree = worker.get_directory_size_py(test_directory)
+
+    expected = sum(1024 * (i + 1) * (j + 1) for i in (0, 1, 3, 4) for j in range(3))
+    assert total_size == expected
+
+    # 走査対象のルート自体が存在しない場合は呼び出し元に通知する
+    missing = os.path.join(test_directory, "missing")
+    with pytest.raises(FileNotFoundError):
+        DirectorySizeWorker(missing, {"skip_network": False}).get_directory_size_py(
+            missing
+        )
+
+
+# オンラインストレージのサブディレクトリのテスト
+def test_python_dir_size_skips_network_subdirs(tmp_path):
+    """Python実装がオンラインストレージ配下のサブディレクトリを走査しないことをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import FLAG_NETWORK_DRIVE, DirectorySizeWorker
+
+    # 2階層下にある OneDrive の配下（docs）はスキップされる
+    cloud_dir = tmp_path / "user" / "OneDrive" / "docs"
+    cloud_dir.mkdir(parents=True)
+    (cloud_dir / "file.bin").write_bytes(b"x" * 1000)
+    (tmp_path / "user" / "local.bin").write_bytes(b"x" * 10)
+
+    worker = DirectorySizeWorker(str(tmp_path), {"skip_network": True})
+    total_size, dir_tree = worker.get_directory_size_py(str(tmp_path))
+
+    assert total_size == 10
+    index = dir_tree.paths.index(str(cloud_dir))
+    assert dir_tree.flags[index] & FLAG_NETWORK_DRIVE
+    assert index not in dir_tree.parents
+
+
+# 深い階層のテスト
+@pytest.mark.skipif(sys.platform == "win32", reason="パス長の制限のため")
+def test_python_dir_size_deep_tree():
+    """再帰の上限より深い階層でもPython実装が動作することをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    temp_dir = tempfile.mkdtemp()
+    depth = sys.getrecursionlimit() + 10
+
+    # os.makedirs / shutil.rmtree は再帰するため1階層ずつ作成・削除する
+    dirs = [temp_dir]
+    for _ in range(depth):
+        dirs.append(os.path.join(dirs[-1], "d"))
+        os.mkdir(dirs[-1])
+    file_path = os.path.join(dirs[-1], "file.txt")
+    with open(file_path, "w") as f:
+        f.write("x" * 100)
+
+    try:
+
+        worker = DirectorySizeWorker(temp_dir, {"skip_network": False})
+        total_size, dir_tree = worker.get_directory_size_py(temp_dir)
+
+        assert total_size == 100
+        assert len(dir_tree) == depth + 1
+        assert all(size == 100 for size in dir_tree.sizes)
+    finally:
+        os.remove(file_path)
+        for path in reversed(dirs):
+            os.rmdir(path)
+
+
+# シンボリックリンクのテスト
+@pytest.mark.skipif(sys.platform == "win32", reason="シンボリックリンクの作成に権限が必要なため")
+def test_python_dir_size_skips_symlinked_dirs(test_directory):
+    """Python実装がディレクトリへのシンボリックリンクを辿らないことをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    # 自分自身を指すリンク（辿ると循環する）
+    os.symlink(test_directory, os.path.join(test_directory, "loop"))
+
+    worker = DirectorySizeWorker(test_directory, {"skip_network": False})
+    total_size, dir_tree = worker.get_directory_size_py(test_directory)
+
+    expected_files = sum(1024 * (i + 1) * (j + 1) for i in range(5) for j in range(3))
+    assert len(dir_tree) == 6
+    assert expected_files <= total_size < expected_files + 4096
+
+
+# ネットワークドライブ・オンラインストレージ判定のテスト
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        (r"\\server\share\dir", True),
+        ("//server/share/dir", True),
+        (r"C:\Users\user\Box\project", True),
+        ("/Users/user/Box Sync/project", True),
+        (r"C:\Users\user\OneDrive - Contoso\docs", True),
+        ("/home/user/dropbox/docs", True),
+        (r"C:\Users\user\Google ドライブ\docs", True),
+        ("/home/user/Nextcloud/docs", True),
+        ("/home/user/Boxes/docs", False),
+        ("/home/user/Box", False),
+        ("/home/user/documents", False),
+    ],
+)
+def test_is_network_drive(path, expected):
+    """ネットワークドライブ・オンラインストレージのパス判定をテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    worker = DirectorySizeWorker(path, {})
+    assert worker.is_network_drive(path) == expected
+
+
+@pytest.mark.parametrize(
+    "parent, path, expected",
+    [
+        ("/home/user/Box", "/home/user/Box/project", True),
+        (r"C:\Users\user", r"C:\Users\user\OneDrive - Contoso", True),
+        ("/home/user", "/home/user/Dropbox", False),
+        ("/home/user/Boxes", "/home/user/Boxes/docs", False),
+        ("/", "/home", False),
+    ],
+)
+def test_is_network_subdir(parent, path, expected):
+    """親がローカルと判定済みのサブディレクトリの判定が、パス全体の判定と一致することをテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import DirectorySizeWorker
+
+    worker = DirectorySizeWorker(parent, {})
+    assert not worker.is_network_drive(parent)
+    assert worker.is_network_subdir(parent, path) == expected
+    assert worker.is_network_drive(path) == expected
+
+
+def test_display_suffixes():
+    """状態フラグから表示名の接尾辞を引く表をテスト"""
+    pytest.importorskip("PyQt6")
+    from Directory_Size_Viewer import (
+        DISPLAY_SUFFIXES,
+        FLAG_ACCESS_DENIED,
+        FLAG_HAS_ACCESS_DENIED,
+        FLAG_NETWORK_DRIVE,
+        FLAG_TIMEOUT,
+    )
+
+    assert DISPLAY_SUFFIXES[0] == ""
+    assert DISPLAY_SUFFIXES[FLAG_HAS_ACCESS_DENIED] == ""
+    assert DISPLAY_SUFFIXES[FLAG_NETWORK_DRIVE] == " (ネットワークドライブ - スキップ)"
+    # 複数のフラグがある場合はアクセス拒否を優先する
+    assert (
+        DISPLAY_SUFFIXES[FLAG_ACCESS_DENIED | FLAG_HAS_ACCESS_DENIED | FLAG_TIMEOUT]
+        == " (アクセス拒否)"
+    )
@@ -2,11 +2,16 @@
 バージョン情報管理モジュール
 """
 
+import functools
+
 # アプリケーションのバージョン
 VERSION = "1.0.1"  # メジャー.マイナー.パッチ
 
-# PyInstallerのバージョン情報（条件付きインポート）
-try:
+
+@functools.cache
+def _build_version_info():
+    """PyInstallerのバージョン情報を構築する（ビルド時のみ使用）"""
+    # PyInstallerがインストールされていない場合は ImportError を送出する
     from PyInstaller.utils.win32.versioninfo import (
         VSVersionInfo,
         FixedFileInfo,
@@ -16,12 +21,8 @@ try:
         VarFileInfo,
         VarStruct,
     )
-except ImportError:
-    # PyInstallerがインストールされていない場合や、実行時には不要
-    pass
-else:
-    # PyInstallerのバージョン情報（ビルド時のみ使用）
-    version_info = VSVersionInfo(
+
+    return VSVersionInfo(
         ffi=FixedFileInfo(
             filevers=(1, 0, 1, 0),
             prodvers=(1, 0, 1, 0),
@@ -55,3 +56,14 @@ else:
             VarFileInfo([VarStruct("Translation", [1033, 1200])]),
         ],
     )
+
+
+def __getattr__(name):
+    """version_info は初めて参照されたときに構築する（PEP 562）"""
+    if name == "version_info":
+        try:
+            return _build_version_info()
+        except ImportError:
+            # PyInstallerがインストールされていない場合や、実行時には不要
+            pass
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
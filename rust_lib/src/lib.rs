@@ -11,13 +11,25 @@
 //! - 進捗報告
 
 use pyo3::prelude::*;
-use pyo3::exceptions::PyIOError;
+use pyo3::create_exception;
+use pyo3::exceptions::{PyException, PyIOError};
 use std::fs;
 use std::io;
 use std::path::{Path, PathBuf};
 use std::fmt;
-use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::atomic::{AtomicBool, AtomicU64, AtomicUsize, Ordering};
 use std::sync::Arc;
+use std::thread;
+use std::time::{Duration, Instant};
+
+/// ツリー構築時に進捗コールバック（GILの取得）を呼び出す最小間隔
+const PROGRESS_INTERVAL: Duration = Duration::from_millis(50);
+
+/// ルート直下のサブディレクトリがこの数より多い場合のみ、スレッドで並列に走査する
+const PARALLEL_MIN_SUBDIRS: usize = 4;
+
+// 処理がキャンセルされたことを示すPythonの例外（rust_lib.CancelledError）
+create_exception!(rust_lib, CancelledError, PyException, "処理がキャンセルされたことを示す例外");
 
 /// ディレクトリサイズ計算時のエラー型
 #[derive(Debug)]
@@ -61,7 +73,10 @@ impl From<(io::Error, &Path)> for DirSizeError {
 
 impl From<DirSizeError> for PyErr {
     fn from(error: DirSizeError) -> Self {
-        PyIOError::new_err(format!("{}", error))
+        match error {
+            DirSizeError::Cancelled => CancelledError::new_err(format!("{}", error)),
+            _ => PyIOError::new_err(format!("{}", error)),
+        }
     }
 }
 
@@ -73,9 +88,10 @@ impl From<DirSizeError> for PyErr {
 /// # 戻り値
 /// * `PyResult<(u64, bool)>` - (計算されたサイズ, アクセス拒否フラグ)またはエラー
 #[pyfunction]
-fn get_dir_size_py(path: String) -> PyResult<(u64, bool)> {
+fn get_dir_size_py(py: Python, path: String) -> PyResult<(u64, bool)> {
     let path_buf = PathBuf::from(path);
-    get_dir_size(&path_buf).map_err(|e| e.into())
+    // 走査中はGILを解放し、他のPythonスレッドを止めない
+    py.allow_threads(|| get_dir_size(&path_buf)).map_err(|e| e.into())
 }
 
 /// アクセス拒否を示す特別な値を返す関数
@@ -206,23 +222,20 @@ where
 ///
 /// # 引数
 /// * `path` - サイズを計算するディレクトリのパス
-/// * `cancel_ptr` - キャンセルフラグへのポインタ
+/// * `cancel_token` - キャンセルトークン
 /// * `progress_callback` - 進捗報告用コールバック関数
 ///
 /// # 戻り値
 /// * `PyResult<(u64, bool)>` - (計算されたサイズ, アクセス拒否フラグ)またはエラー
 #[pyfunction]
 fn get_dir_size_with_cancel_py(
+    py: Python,
     path: String,
-    cancel_ptr: usize,
+    cancel_token: PyRef<CancelToken>,
     progress_callback: PyObject,
 ) -> PyResult<(u64, bool)> {
     let path_buf = PathBuf::from(path);
-    let cancelled = unsafe { Arc::from_raw(cancel_ptr as *const AtomicBool) };
-    
-    // メモリリークを防ぐためにArcをクローン
-    let cancelled_clone = cancelled.clone();
-    std::mem::forget(cancelled);  // 元のArcを忘れる
+    let cancelled = cancel_token.flag.clone();
     
     // 進捗コールバック関数
     let callback = move |path: &str, size: u64| {
@@ -231,8 +244,8 @@ fn get_dir_size_with_cancel_py(
         });
     };
     
-    // ディレクトリサイズを計算
-    let result = get_dir_size_with_progress(&path_buf, cancelled_clone, &callback);
+    // ディレクトリサイズを計算（走査中はGILを解放し、他のPythonスレッドを止めない）
+    let result = py.allow_threads(|| get_dir_size_with_progress(&path_buf, cancelled, &callback));
     
     // 結果を返す
     match result {
@@ -241,66 +254,437 @@ fn get_dir_size_with_cancel_py(
     }
 }
 
-/// キャンセルフラグを作成する関数
+/// ディレクトリツリーの1ノード（ディレクトリ単位）
+#[derive(Debug, Clone)]
+pub struct DirNode {
+    /// 親ノードのインデックス（ルートの場合はNone）
+    pub parent: Option<usize>,
+    /// ディレクトリのパス
+    pub path: String,
+    /// 配下を含めた合計サイズ
+    pub size: u64,
+    /// このディレクトリ自体にアクセスできなかったかどうか
+    pub access_denied: bool,
+    /// 配下にアクセス拒否のディレクトリが含まれるかどうか
+    pub has_access_denied: bool,
+}
+
+/// ディレクトリツリーとサイズを1回の走査で構築する関数（進捗報告とキャンセル機能付き）
+///
+/// 再帰呼び出しは使わず、走査中のディレクトリをフレームのスタックで管理します。
+/// ディレクトリを抜けるときに合計サイズを確定して親のフレームに加算するため、
+/// 各エントリの処理は1回だけです（後行順の集計）。
+/// 各ディレクトリのノードは親より後ろに並ぶ（先行順）ため、
+/// 呼び出し側は先頭から順に処理するだけでツリーを復元できます。
+///
+/// # 引数
+/// * `path` - 走査するディレクトリのパス
+/// * `cancelled` - キャンセルフラグ
+/// * `progress_callback` - 進捗報告用コールバック関数
 ///
 /// # 戻り値
-/// * `PyResult<usize>` - キャンセルフラグへのポインタ（Pythonから管理）
-#[pyfunction]
-fn create_cancel_flag() -> PyResult<usize> {
-    let flag = Arc::new(AtomicBool::new(false));
-    let ptr = Arc::into_raw(flag);
-    Ok(ptr as usize)
+/// * `Result<Vec<DirNode>, DirSizeError>` - ディレクトリノードの一覧（先頭がルート）またはエラー
+pub fn build_dir_tree_with_progress<F>(
+    path: &Path,
+    cancelled: &AtomicBool,
+    progress_callback: &F
+) -> Result<Vec<DirNode>, DirSizeError>
+where
+    F: Fn(&str, u64)
+{
+    /// 走査中のディレクトリの状態
+    struct Frame {
+        /// ノードのインデックス
+        index: usize,
+        /// 未処理のエントリ
+        entries: fs::ReadDir,
+        /// これまでに集計したサイズ
+        size: u64,
+        /// 配下にアクセス拒否のディレクトリがあったかどうか
+        access_denied: bool,
+    }
+
+    // キャンセルされていないか確認
+    if cancelled.load(Ordering::Relaxed) {
+        return Err(DirSizeError::Cancelled);
+    }
+
+    // ルートが読めない場合は原因（存在しない、ディレクトリでないなど）をそのまま返す
+    let root_entries = fs::read_dir(path).map_err(|err| DirSizeError::from((err, path)))?;
+
+    let mut nodes = vec![DirNode {
+        parent: None,
+        path: path.to_string_lossy().into_owned(),
+        size: 0,
+        access_denied: false,
+        has_access_denied: false,
+    }];
+    progress_callback(&nodes[0].path, 0);
+
+    let mut frames = vec![Frame {
+        index: 0,
+        entries: root_entries,
+        size: 0,
+        access_denied: false,
+    }];
+
+    while let Some(frame) = frames.last_mut() {
+        match frame.entries.next() {
+            Some(Ok(entry)) => {
+                // キャンセルされていないか確認
+                if cancelled.load(Ordering::Relaxed) {
+                    return Err(DirSizeError::Cancelled);
+                }
+
+                let metadata = match entry.metadata() {
+                    Ok(metadata) => metadata,
+                    Err(_) => continue,
+                };
+                let entry_path = entry.path();
+
+                if metadata.is_file() {
+                    let file_size = metadata.len();
+                    frame.size += file_size;
+
+                    // 進捗報告
+                    progress_callback(entry_path.to_string_lossy().as_ref(), file_size);
+                } else if metadata.is_dir() {
+                    let index = nodes.len();
+                    nodes.push(DirNode {
+                        parent: Some(frame.index),
+                        path: entry_path.to_string_lossy().into_owned(),
+                        size: 0,
+                        access_denied: false,
+                        has_access_denied: false,
+                    });
+
+                    // 進捗報告
+                    progress_callback(&nodes[index].path, 0);
+
+                    match fs::read_dir(&entry_path) {
+                        Ok(entries) => frames.push(Frame {
+                            index,
+                            entries,
+                            size: 0,
+                            access_denied: false,
+                        }),
+                        Err(_) => {
+                            // 読めないサブディレクトリはフラグを立てて続行
+                            nodes[index].access_denied = true;
+                            frame.access_denied = true;
+                        }
+                    }
+                }
+            },
+            // エラーのあるエントリはスキップ
+            Some(Err(_)) => continue,
+            None => {
+                // ディレクトリを抜けるときにサイズを確定し、親に加算する
+                let Frame { index, size, access_denied, .. } = frames.pop().unwrap();
+                let node = &mut nodes[index];
+                node.size = size;
+                node.has_access_denied = access_denied;
+
+                if let Some(parent) = frames.last_mut() {
+                    parent.size += size;
+                    if access_denied {
+                        parent.access_denied = true;
+                    }
+
+                    // 進捗報告
+                    progress_callback(&nodes[index].path, size);
+                }
+            }
+        }
+    }
+
+    Ok(nodes)
 }
 
-/// キャンセルフラグを設定する関数
+/// ディレクトリツリーとサイズを構築する関数（ルート直下のサブディレクトリごとに並列処理）
+///
+/// ルート直下だけをこのスレッドで読み、各サブディレクトリの配下は
+/// `build_dir_tree_with_progress` でワーカースレッドに分担させます。
+/// 結果はサブディレクトリの順に連結するため、ノードの並びは先行順のままです。
+/// サブディレクトリが `PARALLEL_MIN_SUBDIRS` 以下の場合はスレッドを起動しません。
 ///
 /// # 引数
-/// * `ptr` - キャンセルフラグへのポインタ
-/// * `value` - 設定する値（trueでキャンセル）
+/// * `path` - 走査するディレクトリのパス
+/// * `cancelled` - キャンセルフラグ
+/// * `progress_callback` - 進捗報告用コールバック関数（複数のスレッドから呼び出される）
+/// * `subtree_callback` - サブディレクトリの走査が完了するたびに (パス, 合計サイズ) で
+///   呼び出されるコールバック関数（複数のスレッドから、完了した順に呼び出される）
 ///
 /// # 戻り値
-/// * `PyResult<()>` - 成功または失敗
-#[pyfunction]
-fn set_cancel_flag(ptr: usize, value: bool) -> PyResult<()> {
-    let flag = unsafe { Arc::from_raw(ptr as *const AtomicBool) };
-    flag.store(value, Ordering::SeqCst);
-    // メモリリークを防ぐためにArcを忘れない
-    std::mem::forget(flag);
-    Ok(())
+/// * `Result<Vec<DirNode>, DirSizeError>` - ディレクトリノードの一覧（先頭がルート）またはエラー
+pub fn build_dir_tree_parallel<F, G>(
+    path: &Path,
+    cancelled: &AtomicBool,
+    progress_callback: &F,
+    subtree_callback: &G
+) -> Result<Vec<DirNode>, DirSizeError>
+where
+    F: Fn(&str, u64) + Sync,
+    G: Fn(&str, u64) + Sync
+{
+    let max_threads = thread::available_parallelism().map_or(1, |n| n.get());
+    build_dir_tree_with_threads(path, cancelled, progress_callback, subtree_callback, max_threads)
+}
+
+/// `build_dir_tree_parallel` の本体（スレッド数の上限を指定する）
+///
+/// サブディレクトリが `PARALLEL_MIN_SUBDIRS` より多い場合に、最大 `max_threads` 個の
+/// スレッドで走査します。テストではCPU数によらず複数のスレッドで走査させるために使用します。
+fn build_dir_tree_with_threads<F, G>(
+    path: &Path,
+    cancelled: &AtomicBool,
+    progress_callback: &F,
+    subtree_callback: &G,
+    max_threads: usize
+) -> Result<Vec<DirNode>, DirSizeError>
+where
+    F: Fn(&str, u64) + Sync,
+    G: Fn(&str, u64) + Sync
+{
+    // キャンセルされていないか確認
+    if cancelled.load(Ordering::Relaxed) {
+        return Err(DirSizeError::Cancelled);
+    }
+
+    // ルートが読めない場合は原因（存在しない、ディレクトリでないなど）をそのまま返す
+    let root_entries = fs::read_dir(path).map_err(|err| DirSizeError::from((err, path)))?;
+
+    let mut root = DirNode {
+        parent: None,
+        path: path.to_string_lossy().into_owned(),
+        size: 0,
+        access_denied: false,
+        has_access_denied: false,
+    };
+    progress_callback(&root.path, 0);
+
+    // ルート直下のファイルを集計し、サブディレクトリを列挙
+    let mut subdirs = Vec::new();
+    for entry in root_entries.flatten() {
+        if cancelled.load(Ordering::Relaxed) {
+            return Err(DirSizeError::Cancelled);
+        }
+
+        let metadata = match entry.metadata() {
+            Ok(metadata) => metadata,
+            Err(_) => continue,
+        };
+        if metadata.is_file() {
+            root.size += metadata.len();
+        } else if metadata.is_dir() {
+            subdirs.push(entry.path());
+        }
+    }
+
+    // 各サブディレクトリを走査（空いたスレッドが次のサブディレクトリを取る）
+    let thread_count = if subdirs.len() > PARALLEL_MIN_SUBDIRS {
+        max_threads.min(subdirs.len())
+    } else {
+        1
+    };
+    let next = AtomicUsize::new(0);
+    let walk = || {
+        let mut results = Vec::new();
+        loop {
+            let i = next.fetch_add(1, Ordering::Relaxed);
+            let Some(subdir) = subdirs.get(i) else { break };
+            let result = build_dir_tree_with_progress(subdir, cancelled, progress_callback);
+            if let Ok(subtree) = &result {
+                subtree_callback(&subtree[0].path, subtree[0].size);
+            }
+            results.push((i, result));
+        }
+        results
+    };
+    let mut results = if thread_count > 1 {
+        thread::scope(|scope| {
+            let handles: Vec<_> = (0..thread_count).map(|_| scope.spawn(walk)).collect();
+            handles
+                .into_iter()
+                .flat_map(|handle| handle.join().unwrap())
+                .collect::<Vec<_>>()
+        })
+    } else {
+        walk()
+    };
+    results.sort_unstable_by_key(|(i, _)| *i);
+
+    // サブツリーをサブディレクトリの順に連結し、親インデックスを付け替える
+    let mut nodes = vec![root];
+    for ((_, result), subdir) in results.into_iter().zip(&subdirs) {
+        match result {
+            Ok(subtree) => {
+                let offset = nodes.len();
+                nodes[0].size += subtree[0].size;
+                if subtree[0].has_access_denied {
+                    nodes[0].has_access_denied = true;
+                }
+                nodes.extend(subtree.into_iter().map(|mut node| {
+                    node.parent = Some(node.parent.map_or(0, |parent| parent + offset));
+                    node
+                }));
+            },
+            Err(DirSizeError::Cancelled) => return Err(DirSizeError::Cancelled),
+            Err(_) => {
+                // 読めないサブディレクトリはフラグを立てて続行
+                nodes.push(DirNode {
+                    parent: Some(0),
+                    path: subdir.to_string_lossy().into_owned(),
+                    size: 0,
+                    access_denied: true,
+                    has_access_denied: false,
+                });
+                nodes[0].has_access_denied = true;
+            }
+        }
+    }
+
+    Ok(nodes)
+}
+
+/// 複数のスレッドから呼び出される進捗報告を `PROGRESS_INTERVAL` ごとに間引く
+///
+/// 最後に報告した時刻を作成時からの経過ミリ秒としてアトミック変数に保持し、
+/// ロックを取らずに判定します（0 は未報告を表し、記録する値は経過ミリ秒 + 1）。
+struct ProgressThrottle {
+    /// 作成時刻
+    start: Instant,
+    /// 最後に報告した時刻（作成時からの経過ミリ秒 + 1）
+    last_report: AtomicU64,
+}
+
+impl ProgressThrottle {
+    /// まだ報告していない状態で作成する
+    fn new() -> Self {
+        Self {
+            start: Instant::now(),
+            last_report: AtomicU64::new(0),
+        }
+    }
+
+    /// 報告してよい場合に true を返す（同時に呼び出された場合は1つのスレッドだけが true）
+    fn should_report(&self) -> bool {
+        let now = self.start.elapsed().as_millis() as u64 + 1;
+        let last = self.last_report.load(Ordering::Relaxed);
+        if last != 0 && now.saturating_sub(last) < PROGRESS_INTERVAL.as_millis() as u64 {
+            return false;
+        }
+        // 同時に間隔を過ぎた他のスレッドが先に記録した場合は報告しない
+        self.last_report
+            .compare_exchange(last, now, Ordering::Relaxed, Ordering::Relaxed)
+            .is_ok()
+    }
+}
+
+/// Pythonから利用するキャンセルトークン
+///
+/// キャンセルフラグを `Arc<AtomicBool>` として保持し、生ポインタを介さずに
+/// Rust側の関数へ渡せるようにします。Python側のオブジェクトが破棄されると解放されます。
+#[pyclass]
+#[derive(Clone, Default)]
+pub struct CancelToken {
+    flag: Arc<AtomicBool>,
+}
+
+#[pymethods]
+impl CancelToken {
+    /// キャンセルされていないトークンを作成する
+    #[new]
+    fn new() -> Self {
+        Self::default()
+    }
+
+    /// キャンセルを要求する
+    fn set(&self) {
+        self.flag.store(true, Ordering::SeqCst);
+    }
+
+    /// キャンセルが要求されているかどうか
+    fn is_set(&self) -> bool {
+        self.flag.load(Ordering::SeqCst)
+    }
 }
 
-/// キャンセルフラグを解放する関数
+/// Pythonから呼び出し可能なツリー構築関数（キャンセル機能付き）
 ///
 /// # 引数
-/// * `ptr` - キャンセルフラグへのポインタ
+/// * `path` - 走査するディレクトリのパス
+/// * `cancel_token` - キャンセルトークン
+/// * `progress_callback` - 進捗報告用コールバック関数
+/// * `partial_callback` - ルート直下のサブディレクトリの走査が完了するたびに
+///   (パス, 合計サイズ) で呼び出されるコールバック関数（省略可）
 ///
 /// # 戻り値
-/// * `PyResult<()>` - 成功または失敗
+/// * `PyResult<Vec<(Option<usize>, String, u64, bool, bool)>>` -
+///   (親インデックス, パス, サイズ, アクセス拒否フラグ, 配下のアクセス拒否フラグ)の一覧またはエラー
 #[pyfunction]
-fn release_cancel_flag(ptr: usize) -> PyResult<()> {
-    unsafe {
-        let _ = Arc::from_raw(ptr as *const AtomicBool);
-    }
-    Ok(())
+#[pyo3(signature = (path, cancel_token, progress_callback, partial_callback=None))]
+fn build_dir_tree_with_cancel_py(
+    py: Python,
+    path: String,
+    cancel_token: PyRef<CancelToken>,
+    progress_callback: PyObject,
+    partial_callback: Option<PyObject>,
+) -> PyResult<Vec<(Option<usize>, String, u64, bool, bool)>> {
+    let path_buf = PathBuf::from(path);
+    let cancelled = cancel_token.flag.clone();
+
+    // 進捗コールバック関数（GILの取得は PROGRESS_INTERVAL ごとに間引く）
+    let throttle = ProgressThrottle::new();
+    let callback = move |path: &str, size: u64| {
+        if !throttle.should_report() {
+            return;
+        }
+
+        Python::with_gil(|py| {
+            let _ = progress_callback.call1(py, (path, size));
+        });
+    };
+
+    // サブディレクトリ完了の通知（呼び出しはルート直下のサブディレクトリの数だけ）
+    let subtree_callback = move |path: &str, size: u64| {
+        if let Some(partial_callback) = &partial_callback {
+            Python::with_gil(|py| {
+                let _ = partial_callback.call1(py, (path, size));
+            });
+        }
+    };
+
+    // 走査中はGILを解放し、GUIスレッドなど他のPythonスレッドを止めない
+    let nodes = py.allow_threads(|| {
+        build_dir_tree_parallel(&path_buf, &cancelled, &callback, &subtree_callback)
+    })?;
+
+    Ok(nodes
+        .into_iter()
+        .map(|node| (node.parent, node.path, node.size, node.access_denied, node.has_access_denied))
+        .collect())
 }
 
 /// Python モジュールの初期化関数
 #[pymodule]
-fn rust_lib(_py: Python, m: &PyModule) -> PyResult<()> {
+fn rust_lib(py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_dir_size_py, m)?)?;
     m.add_function(wrap_pyfunction!(get_access_denied_value, m)?)?;
     m.add_function(wrap_pyfunction!(get_dir_size_with_cancel_py, m)?)?;
-    m.add_function(wrap_pyfunction!(create_cancel_flag, m)?)?;
-    m.add_function(wrap_pyfunction!(set_cancel_flag, m)?)?;
-    m.add_function(wrap_pyfunction!(release_cancel_flag, m)?)?;
+    m.add_function(wrap_pyfunction!(build_dir_tree_with_cancel_py, m)?)?;
+    m.add_class::<CancelToken>()?;
+    m.add("CancelledError", py.get_type::<CancelledError>())?;
     Ok(())
 }
 
 #[cfg(test)]
 mod tests {
     use super::*;
+    use std::collections::HashSet;
     use std::fs::File;
     use std::io::Write;
+    use std::sync::Mutex;
     use tempfile::tempdir;
 
     /// 正常なディレクトリサイズ計算のテスト
@@ -315,8 +699,9 @@ mod tests {
 
         drop(file);
 
-        let size = get_dir_size(dir_path).unwrap();
+        let (size, access_denied) = get_dir_size(dir_path).unwrap();
         assert!(size > 0);
+        assert!(!access_denied);
     }
 
     /// 存在しないディレクトリに対するテスト
@@ -345,13 +730,18 @@ mod tests {
         #[cfg(not(windows))]
         let dir_path = Path::new("/root"); // 例
 
+        // 実行ユーザーが読み取れる環境（管理者権限での実行など）では確認できない
+        if fs::read_dir(dir_path).is_ok() {
+            return;
+        }
+
         let result = get_dir_size(dir_path);
         
         // Windows環境では権限によって結果が異なる可能性があるため、
-        // エラーまたはu64::MAXのどちらかを許容
+        // エラーまたはアクセス拒否フラグのどちらかを許容
         match result {
-            Ok(size) => {
-                assert_eq!(size, u64::MAX, "Expected access denied value");
+            Ok((_, access_denied)) => {
+                assert!(access_denied, "Expected access denied flag");
             },
             Err(DirSizeError::IoError { path: _, cause }) => {
                 assert_eq!(cause.kind(), io::ErrorKind::PermissionDenied);
@@ -394,4 +784,204 @@ mod tests {
         // キャンセルエラーを期待
         assert!(matches!(result, Err(DirSizeError::Cancelled)));
     }
-}
\ No newline at end of file
+
+    /// ツリー構築のテスト
+    #[test]
+    fn test_build_dir_tree() {
+        let dir = tempdir().unwrap();
+        let dir_path = dir.path();
+
+        for i in 0..3 {
+            let subdir = dir_path.join(format!("subdir_{}", i));
+            fs::create_dir(&subdir).unwrap();
+
+            let mut file = File::create(subdir.join("file.txt")).unwrap();
+            write!(file, "{}", "x".repeat(100 * (i + 1))).unwrap();
+        }
+
+        let cancelled = AtomicBool::new(false);
+        let progress_callback = |_path: &str, _size: u64| {};
+
+        let nodes = build_dir_tree_with_progress(dir_path, &cancelled, &progress_callback).unwrap();
+
+        // ルート + サブディレクトリ3つ
+        assert_eq!(nodes.len(), 4);
+        assert!(nodes[0].parent.is_none());
+        assert_eq!(nodes[0].size, 600);
+        for node in &nodes[1..] {
+            assert_eq!(node.parent, Some(0));
+        }
+        let children_total: u64 = nodes[1..].iter().map(|node| node.size).sum();
+        assert_eq!(children_total, nodes[0].size);
+    }
+
+    /// ツリー構築で存在しないルートを指定した場合のテスト
+    #[test]
+    fn test_build_dir_tree_not_found() {
+        let cancelled = AtomicBool::new(false);
+        let progress_callback = |_path: &str, _size: u64| {};
+
+        let result = build_dir_tree_with_progress(Path::new("nonexistent_directory"), &cancelled, &progress_callback);
+
+        match result {
+            Err(DirSizeError::IoError { path, cause }) => {
+                assert_eq!(path, "nonexistent_directory");
+                assert_eq!(cause.kind(), io::ErrorKind::NotFound);
+            },
+            _ => panic!("IoErrorを期待"),
+        }
+    }
+
+    /// 並列のツリー構築が逐次の場合と同じノード一覧を返すことのテスト
+    #[test]
+    fn test_build_dir_tree_parallel() {
+        // スレッドで走査される場合（PARALLEL_MIN_SUBDIRS より多い）、
+        // サブディレクトリの数よりスレッドが多い場合、しきい値ちょうどの場合（逐次）
+        for (subdir_count, max_threads) in [
+            (PARALLEL_MIN_SUBDIRS * 4, 4),
+            (PARALLEL_MIN_SUBDIRS + 1, 64),
+            (PARALLEL_MIN_SUBDIRS, 4),
+        ] {
+            check_build_dir_tree_parallel(subdir_count, max_threads);
+        }
+    }
+
+    /// subdir_count 個のサブディレクトリで並列版と逐次版の結果を比較する
+    fn check_build_dir_tree_parallel(subdir_count: usize, max_threads: usize) {
+        let dir = tempdir().unwrap();
+        let dir_path = dir.path();
+
+        for i in 0..subdir_count {
+            let subdir = dir_path.join(format!("subdir_{}", i));
+            fs::create_dir_all(subdir.join("nested")).unwrap();
+
+            let mut file = File::create(subdir.join("nested").join("file.txt")).unwrap();
+            write!(file, "{}", "x".repeat(100 * (i + 1))).unwrap();
+        }
+        let mut file = File::create(dir_path.join("root.txt")).unwrap();
+        write!(file, "{}", "x".repeat(10)).unwrap();
+
+        let cancelled = AtomicBool::new(false);
+        // 1つのスレッドがすべてのサブディレクトリを取ってしまわないよう、走査を少し遅くする
+        let progress_callback = |_path: &str, _size: u64| thread::sleep(Duration::from_millis(1));
+
+        let sequential = build_dir_tree_with_progress(dir_path, &cancelled, &progress_callback).unwrap();
+        let completed = Mutex::new(Vec::new());
+        let threads = Mutex::new(Vec::new());
+        let subtree_callback = |path: &str, size: u64| {
+            completed.lock().unwrap().push((path.to_string(), size));
+            threads.lock().unwrap().push(thread::current().id());
+        };
+        let parallel = build_dir_tree_with_threads(
+            dir_path, &cancelled, &progress_callback, &subtree_callback, max_threads
+        ).unwrap();
+
+        let summary = |nodes: &[DirNode]| -> Vec<(Option<usize>, String, u64)> {
+            nodes.iter().map(|node| (node.parent, node.path.clone(), node.size)).collect()
+        };
+        assert_eq!(summary(&parallel), summary(&sequential));
+        let expected_size = 10 + (1..=subdir_count as u64).map(|i| 100 * i).sum::<u64>();
+        assert_eq!(parallel[0].size, expected_size);
+
+        // 完了通知はルート直下のサブディレクトリごとに1回（重複・抜けがない）
+        let mut completed = completed.into_inner().unwrap();
+        assert_eq!(completed.len(), subdir_count);
+        completed.sort();
+        let mut expected: Vec<(String, u64)> = parallel
+            .iter()
+            .filter(|node| node.parent == Some(0))
+            .map(|node| (node.path.clone(), node.size))
+            .collect();
+        expected.sort();
+        assert_eq!(completed, expected);
+
+        // しきい値より多い場合は複数のスレッドで、それ以外は呼び出し元のスレッドで走査する
+        let threads: HashSet<_> = threads.into_inner().unwrap().into_iter().collect();
+        if subdir_count > PARALLEL_MIN_SUBDIRS && max_threads > 1 {
+            assert!(threads.len() > 1);
+        } else {
+            assert_eq!(threads, HashSet::from([thread::current().id()]));
+        }
+    }
+
+    /// 入れ子のディレクトリで親のサイズに子孫のサイズが集計されることのテスト
+    #[test]
+    fn test_build_dir_tree_nested() {
+        let dir = tempdir().unwrap();
+        let mut current = dir.path().to_path_buf();
+
+        // 3階層のディレクトリの各階層に100バイトのファイルを作成
+        for depth in 0..3 {
+            current = current.join(format!("level_{}", depth));
+            fs::create_dir(&current).unwrap();
+
+            let mut file = File::create(current.join("file.txt")).unwrap();
+            write!(file, "{}", "x".repeat(100)).unwrap();
+        }
+
+        // level_0 の下に別の枝（50バイト）を追加し、兄弟の枝の集計も確認する
+        let sibling = dir.path().join("level_0").join("sibling");
+        fs::create_dir(&sibling).unwrap();
+        let mut file = File::create(sibling.join("file.txt")).unwrap();
+        write!(file, "{}", "x".repeat(50)).unwrap();
+
+        let cancelled = AtomicBool::new(false);
+        let progress_callback = |_path: &str, _size: u64| {};
+
+        let nodes = build_dir_tree_with_progress(dir.path(), &cancelled, &progress_callback).unwrap();
+
+        // 兄弟の順序は read_dir の順序に依存するため、ディレクトリ名で比較する
+        let name = |index: usize| -> String {
+            Path::new(&nodes[index].path).file_name().unwrap().to_string_lossy().into_owned()
+        };
+        let parent_name = |index: usize| match nodes[index].parent {
+            Some(0) => "root".to_string(),
+            Some(parent) => name(parent),
+            None => unreachable!(),
+        };
+        let mut summary: Vec<(String, String, u64)> = (1..nodes.len())
+            .map(|index| (name(index), parent_name(index), nodes[index].size))
+            .collect();
+        summary.sort();
+
+        assert!(nodes[0].parent.is_none());
+        assert_eq!(nodes[0].size, 350);
+        assert_eq!(
+            summary,
+            vec![
+                ("level_0".to_string(), "root".to_string(), 350),
+                ("level_1".to_string(), "level_0".to_string(), 200),
+                ("level_2".to_string(), "level_1".to_string(), 100),
+                ("sibling".to_string(), "level_0".to_string(), 50),
+            ]
+        );
+
+        // 親は常に子より前に並ぶ（先行順）
+        for (index, node) in nodes.iter().enumerate().skip(1) {
+            assert!(node.parent.unwrap() < index);
+        }
+    }
+
+    /// 進捗報告の間引きのテスト
+    #[test]
+    fn test_progress_throttle() {
+        let throttle = ProgressThrottle::new();
+        assert!(throttle.should_report());
+        assert!(!throttle.should_report());
+
+        thread::sleep(PROGRESS_INTERVAL + Duration::from_millis(10));
+
+        // 間隔を過ぎた後に同時に呼び出しても、報告するのは1つのスレッドだけ
+        let reported = AtomicUsize::new(0);
+        thread::scope(|scope| {
+            for _ in 0..8 {
+                scope.spawn(|| {
+                    if throttle.should_report() {
+                        reported.fetch_add(1, Ordering::Relaxed);
+                    }
+                });
+            }
+        });
+        assert_eq!(reported.load(Ordering::Relaxed), 1);
+    }
+}